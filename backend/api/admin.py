@@ -0,0 +1,163 @@
+from django.contrib import admin, messages
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+from api.gateway import write_gateway_config
+from api.models import Job, RequestProfile
+from api.profiling import format_stats
+from recipes.models import RecipeLink
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'action',
+        'method',
+        'path',
+        'duration',
+        'sampled',
+        'user',
+        'created_at',
+    )
+    list_filter = [
+        'action',
+        'sampled',
+    ]
+    search_fields = (
+        'path',
+    )
+    fields = (
+        'action',
+        'method',
+        'path',
+        'duration',
+        'sampled',
+        'user',
+        'created_at',
+        'downloads',
+        'top_functions',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Files')
+    def downloads(self, obj):
+        url_name = 'admin:api_requestprofile_download'
+        return format_html(
+            '<a href="{}">pstats</a> | <a href="{}">collapsed stacks</a>',
+            reverse(url_name, args=[obj.pk, 'stats']),
+            reverse(url_name, args=[obj.pk, 'stacks'])
+        )
+
+    @admin.display(description='Top functions')
+    def top_functions(self, obj):
+        return format_html('<pre>{}</pre>', format_stats(obj.stats_file.path))
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/<str:kind>/',
+                self.admin_site.admin_view(self.download),
+                name='api_requestprofile_download'
+            ),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        """
+        Profiles are not under MEDIA_ROOT, so files are served here.
+        """
+        if kind not in ('stats', 'stacks'):
+            raise Http404
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if not self.has_view_permission(request, profile):
+            raise Http404
+        file = getattr(profile, f'{kind}_file')
+        return FileResponse(
+            file.open('rb'),
+            as_attachment=True,
+            filename=file.name.replace('/', '-')
+        )
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'task',
+        'run_at',
+        'attempts',
+        'max_attempts',
+        'created_at',
+        'failed_at',
+    )
+    list_filter = [
+        'task',
+        ('failed_at', admin.EmptyFieldListFilter),
+    ]
+    readonly_fields = (
+        'task',
+        'args',
+        'kwargs',
+        'attempts',
+        'created_at',
+        'failed_at',
+        'error',
+    )
+    actions = ['retry']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Retry selected jobs now')
+    def retry(self, request, queryset):
+        queryset.update(run_at=timezone.now(), attempts=0, failed_at=None)
+
+
+@admin.register(RecipeLink)
+class RecipeLinkAdmin(admin.ModelAdmin):
+    list_display = (
+        'link',
+        'recipe',
+    )
+    search_fields = (
+        'link',
+    )
+    raw_id_fields = (
+        'recipe',
+    )
+    actions = ['regenerate_gateway_config', 'purge_micro_cache']
+
+    @admin.action(description='Regenerate the nginx short-link map')
+    def regenerate_gateway_config(self, request, queryset):
+        self.write_gateway_config(request, purge=False)
+
+    @admin.action(
+        description='Purge the nginx micro-cache and regenerate the map'
+    )
+    def purge_micro_cache(self, request, queryset):
+        self.write_gateway_config(request, purge=True)
+
+    def write_gateway_config(self, request, purge):
+        """
+        Both actions cover every link, whatever the selection.
+        """
+        try:
+            count, version = write_gateway_config(purge=purge)
+        except OSError as error:
+            self.message_user(
+                request, f'Could not write the gateway config: {error}',
+                messages.ERROR
+            )
+            return
+        self.message_user(
+            request,
+            f'Wrote {count} short links, micro-cache version {version}. '
+            'The gateway picks them up within seconds.'
+        )
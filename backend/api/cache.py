@@ -0,0 +1,261 @@
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+MISSING = object()
+LOCK_STRIPES = 64
+
+
+class LocalLRU:
+    """
+    Bounded in-process LRU with per-entry expiry.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        """
+        Store a value and return how many entries were evicted.
+        """
+        evicted = 0
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class TwoTierCache:
+    """
+    In-process LRU in front of a shared Django cache.
+
+    Keys live in namespaces whose version is stored in the shared tier,
+    so ``invalidate(namespace)`` drops every key of the namespace in all
+    workers; each worker re-reads versions at most every
+    ``version_timeout`` seconds. Shared entries carry a soft expiry: after
+    it one worker takes a lock and recomputes while the others keep
+    serving the stale value, so a hot key is never recomputed by every
+    worker at once. Threads of one worker are serialized by striped
+    in-process locks, workers by an ``add()`` lock in the shared tier.
+
+    The shared tier must keep the keys it is asked for: memcached
+    evicts least recently used entries, and the versions are read by
+    every worker each ``version_timeout``. An evicted version only
+    starts the namespace afresh under a new random one, an evicted lock
+    lets one more worker recompute.
+    """
+
+    def __init__(self, alias='default', local_max_entries=1024,
+                 local_timeout=5, version_timeout=1, lock_timeout=10,
+                 stale_timeout=60):
+        self.alias = alias
+        self.local = LocalLRU(local_max_entries)
+        self.local_timeout = local_timeout
+        self.version_timeout = version_timeout
+        self.lock_timeout = lock_timeout
+        self.stale_timeout = stale_timeout
+        self.versions = {}
+        self.counters = Counter()
+        self.counters_lock = threading.Lock()
+        self.key_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def count(self, namespace, event, amount=1):
+        with self.counters_lock:
+            self.counters[namespace, event] += amount
+
+    def stats(self):
+        """
+        Return {namespace: {event: count}} for this process.
+        """
+        with self.counters_lock:
+            counters = dict(self.counters)
+        stats = {}
+        for (namespace, event), value in counters.items():
+            stats.setdefault(namespace, {})[event] = value
+        return stats
+
+    def namespace_version(self, namespace):
+        version, checked_at = self.versions.get(namespace, (None, 0))
+        if time.monotonic() - checked_at > self.version_timeout:
+            version_key = f'cache:namespace:{namespace}'
+            version = self.shared.get(version_key)
+            if version is None:
+                version = uuid.uuid4().hex[:8]
+                if not self.shared.add(version_key, version, None):
+                    version = self.shared.get(version_key, version)
+            self.versions[namespace] = (version, time.monotonic())
+        return version
+
+    def make_key(self, namespace, key):
+        return f'{namespace}:{self.namespace_version(namespace)}:{key}'
+
+    def invalidate(self, namespace):
+        """
+        Drop all keys of a namespace by switching it to a new version.
+        """
+        version = uuid.uuid4().hex[:8]
+        self.shared.set(f'cache:namespace:{namespace}', version, None)
+        self.versions[namespace] = (version, time.monotonic())
+        self.count(namespace, 'invalidations')
+
+    def set_local(self, namespace, key, value, timeout):
+        evicted = self.local.set(
+            key, value, min(timeout, self.local_timeout)
+        )
+        if evicted:
+            self.count(namespace, 'evictions', evicted)
+
+    def set_shared(self, key, value, timeout):
+        self.shared.set(
+            key,
+            (value, time.time() + timeout),
+            timeout + self.stale_timeout
+        )
+
+    def get(self, namespace, key, default=None):
+        full_key = self.make_key(namespace, key)
+        value = self.local.get(full_key)
+        if value is not MISSING:
+            self.count(namespace, 'hits')
+            return value
+        entry = self.shared.get(full_key)
+        if entry is None or entry[1] < time.time():
+            self.count(namespace, 'misses')
+            return default
+        self.count(namespace, 'shared_hits')
+        self.set_local(namespace, full_key, entry[0], entry[1] - time.time())
+        return entry[0]
+
+    def set(self, namespace, key, value, timeout):
+        full_key = self.make_key(namespace, key)
+        self.set_shared(full_key, value, timeout)
+        self.set_local(namespace, full_key, value, timeout)
+
+    def delete(self, namespace, key):
+        full_key = self.make_key(namespace, key)
+        self.shared.delete(full_key)
+        self.local.delete(full_key)
+
+    def get_or_set(self, namespace, key, compute, timeout):
+        """
+        Return the cached value, calling ``compute()`` in at most one
+        worker at a time when it is missing or stale.
+        """
+        full_key = self.make_key(namespace, key)
+        value = self.local.get(full_key)
+        if value is not MISSING:
+            self.count(namespace, 'hits')
+            return value
+        entry = self.shared.get(full_key)
+        if entry is not None and entry[1] >= time.time():
+            self.count(namespace, 'shared_hits')
+            self.set_local(
+                namespace, full_key, entry[0], entry[1] - time.time()
+            )
+            return entry[0]
+        key_lock = self.key_locks[hash(full_key) % LOCK_STRIPES]
+        if not key_lock.acquire(blocking=entry is None):
+            self.count(namespace, 'stale_hits')
+            return entry[0]
+        try:
+            return self.compute_once(
+                namespace, key, full_key, entry, compute, timeout
+            )
+        finally:
+            key_lock.release()
+
+    def compute_once(self, namespace, key, full_key, entry, compute,
+                     timeout):
+        fresh = self.shared.get(full_key)
+        if fresh is not None and fresh[1] >= time.time():
+            self.count(namespace, 'shared_hits')
+            return fresh[0]
+        lock_key = f'{full_key}:lock'
+        if not self.shared.add(lock_key, 1, self.lock_timeout):
+            if entry is not None:
+                self.count(namespace, 'stale_hits')
+                return entry[0]
+            entry = self.wait_for(full_key)
+            if entry is not None:
+                self.count(namespace, 'shared_hits')
+                return entry[0]
+        self.count(namespace, 'misses')
+        try:
+            value = compute()
+            self.set(namespace, key, value, timeout)
+        finally:
+            self.shared.delete(lock_key)
+        return value
+
+    def wait_for(self, full_key):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = self.shared.get(full_key)
+            if entry is not None:
+                return entry
+        return None
+
+    def get_many(self, namespace, keys):
+        """
+        Return {key: value} for the fresh entries among keys.
+        """
+        found = {}
+        full_keys = {}
+        for key in keys:
+            full_key = self.make_key(namespace, key)
+            value = self.local.get(full_key)
+            if value is MISSING:
+                full_keys[full_key] = key
+            else:
+                found[key] = value
+        self.count(namespace, 'hits', len(found))
+        now = time.time()
+        for full_key, entry in self.shared.get_many(full_keys).items():
+            if entry[1] >= now:
+                found[full_keys[full_key]] = entry[0]
+                self.set_local(namespace, full_key, entry[0], entry[1] - now)
+                self.count(namespace, 'shared_hits')
+        self.count(namespace, 'misses', len(keys) - len(found))
+        return found
+
+    def set_many(self, namespace, values, timeout):
+        expires_at = time.time() + timeout
+        shared_values = {}
+        for key, value in values.items():
+            full_key = self.make_key(namespace, key)
+            shared_values[full_key] = (value, expires_at)
+            self.set_local(namespace, full_key, value, timeout)
+        self.shared.set_many(shared_values, timeout + self.stale_timeout)
+
+
+api_cache = TwoTierCache(**settings.API_CACHE)
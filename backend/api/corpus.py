@@ -0,0 +1,327 @@
+import gzip
+import io
+import json
+import sys
+import time
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.db import router, transaction
+from django.utils.dateparse import parse_datetime
+
+from api.cache import api_cache
+from api.storage import acquire
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeScore,
+    Tag
+)
+from users.models import User
+
+
+def open_stream(path, mode, compress=None):
+    """
+    Open ``path`` ('-' for stdin or stdout) as UTF-8 text, gzipped
+    when ``compress`` is set or, if it is None, when the name ends
+    with .gz.
+    """
+    if compress is None:
+        compress = path.endswith('.gz')
+    if path == '-':
+        binary = sys.stdout.buffer if mode == 'w' else sys.stdin.buffer
+        if compress:
+            binary = gzip.GzipFile(fileobj=binary, mode=mode)
+        return io.TextIOWrapper(binary, encoding='utf-8')
+    if compress:
+        return gzip.open(path, f'{mode}t', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class Progress:
+    """
+    Report a running count and throughput at most every ``interval``
+    seconds.
+    """
+
+    def __init__(self, stream, noun, interval=2):
+        self.stream = stream
+        self.noun = noun
+        self.interval = interval
+        self.started_at = self.reported_at = time.perf_counter()
+        self.counts = Counter()
+
+    def add(self, **counts):
+        self.counts.update(counts)
+        now = time.perf_counter()
+        if now - self.reported_at >= self.interval:
+            self.reported_at = now
+            self.stream.write(self.summary())
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started_at
+        done = self.counts['done']
+        details = ''.join(
+            f', {count} {name}' for name, count in sorted(self.counts.items())
+            if name != 'done'
+        )
+        return (
+            f'{done} {self.noun}{details} in {elapsed:.1f} s '
+            f'({done / elapsed if elapsed else 0:.0f}/s)'
+        )
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_recipes(queryset, chunk_size=1000):
+    """
+    Yield recipes as dicts with nested ingredients, tags and author,
+    reading ``chunk_size`` recipes and two queries for their related
+    rows at a time.
+    """
+    recipes = queryset.select_related('author').order_by('id').iterator(
+        chunk_size=chunk_size
+    )
+    for chunk in chunked(recipes, chunk_size):
+        ids = [recipe.pk for recipe in chunk]
+        ingredients = {}
+        for item in RecipeIngredient.objects.filter(
+            recipe_id__in=ids
+        ).select_related('ingredient').order_by('id'):
+            ingredients.setdefault(item.recipe_id, []).append({
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            })
+        tags = {}
+        for item in Recipe.tags.through.objects.filter(
+            recipe_id__in=ids
+        ).select_related('tag').order_by('id'):
+            tags.setdefault(item.recipe_id, []).append({
+                'name': item.tag.name,
+                'slug': item.tag.slug,
+            })
+        for recipe in chunk:
+            yield {
+                'id': recipe.pk,
+                'author': {
+                    'email': recipe.author.email,
+                    'username': recipe.author.username,
+                    'first_name': recipe.author.first_name,
+                    'last_name': recipe.author.last_name,
+                },
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': recipe.image.name or None,
+                'pub_date': recipe.pub_date.isoformat(),
+                'ingredients': ingredients.get(recipe.pk, []),
+                'tags': tags.get(recipe.pk, []),
+            }
+
+
+class RecipeImporter:
+    """
+    Insert exported recipes in batches, mapping authors by email,
+    ingredients by name and unit and tags by slug to existing rows
+    and creating the missing ones. Lookups are cached, so memory
+    grows with the number of distinct authors, ingredients and tags,
+    not with the number of recipes.
+    """
+
+    def __init__(self, create_authors=True, using=None):
+        self.create_authors = create_authors
+        self.using = using or router.db_for_write(Recipe)
+        self.authors = {}
+        self.ingredients = {}
+        self.tags = {}
+
+    def import_batch(self, records):
+        """
+        Insert one batch in a transaction and return
+        (imported, skipped, [(exported id, new id)]).
+        """
+        with transaction.atomic(using=self.using):
+            self.resolve_authors(records)
+            self.resolve_ingredients(records)
+            self.resolve_tags(records)
+            return self.insert_recipes(records)
+
+    def resolve_authors(self, records):
+        missing = {
+            record['author']['email']: record['author']
+            for record in records
+            if record['author']['email'] not in self.authors
+        }
+        if not missing:
+            return
+        self.authors.update(
+            User.objects.filter(email__in=missing)
+            .values_list('email', 'pk')
+        )
+        if not self.create_authors:
+            return
+        taken = set(User.objects.filter(username__in=[
+            author['username'] for author in missing.values()
+        ]).values_list('username', flat=True))
+        new = []
+        for email, author in missing.items():
+            if email in self.authors:
+                continue
+            user = User(
+                email=email,
+                username=(
+                    author['username'] if author['username'] not in taken
+                    else email
+                )[:150],
+                first_name=author['first_name'],
+                last_name=author['last_name']
+            )
+            user.set_unusable_password()
+            new.append(user)
+        User.objects.bulk_create(new)
+        self.authors.update(
+            User.objects.filter(email__in=[user.email for user in new])
+            .values_list('email', 'pk')
+        )
+
+    def resolve_ingredients(self, records):
+        missing = {
+            (item['name'], item['measurement_unit'])
+            for record in records for item in record['ingredients']
+        } - set(self.ingredients)
+        if not missing:
+            return
+        names = {name for name, _ in missing}
+        for name, unit, pk in Ingredient.objects.filter(
+            name__in=names
+        ).values_list('name', 'measurement_unit', 'pk').order_by('pk'):
+            self.ingredients.setdefault((name, unit), pk)
+        new = missing - set(self.ingredients)
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in new
+        ])
+        for name, unit, pk in Ingredient.objects.filter(
+            name__in={name for name, _ in new}
+        ).values_list('name', 'measurement_unit', 'pk').order_by('pk'):
+            self.ingredients.setdefault((name, unit), pk)
+
+    def resolve_tags(self, records):
+        missing = {
+            tag['slug']: tag['name']
+            for record in records for tag in record['tags']
+            if tag['slug'] not in self.tags
+        }
+        if not missing:
+            return
+        self.tags.update(
+            Tag.objects.filter(slug__in=missing).values_list('slug', 'pk')
+        )
+        Tag.objects.bulk_create([
+            Tag(slug=slug, name=name) for slug, name in missing.items()
+            if slug not in self.tags
+        ])
+        self.tags.update(
+            Tag.objects.filter(slug__in=missing).values_list('slug', 'pk')
+        )
+
+    def insert_recipes(self, records):
+        """
+        Recipes keep no exported ids: new ids are looked up by the
+        unique (author, name) pair, which works on every backend,
+        unlike ids returned by bulk_create. Recipes whose pair already
+        exists are skipped.
+        """
+        keys = {}
+        for record in records:
+            author_id = self.authors.get(record['author']['email'])
+            if author_id is not None:
+                keys.setdefault((author_id, record['name']), record)
+        existing = set(
+            Recipe.objects.filter(
+                author_id__in={author_id for author_id, _ in keys},
+                name__in={name for _, name in keys}
+            ).values_list('author_id', 'name')
+        )
+        new = {
+            key: record for key, record in keys.items()
+            if key not in existing
+        }
+        recipes = []
+        for (author_id, name), record in new.items():
+            image = record['image']
+            if image and not default_storage.exists(image):
+                image = None
+            recipes.append(Recipe(
+                author_id=author_id,
+                name=name,
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=image
+            ))
+        Recipe.objects.bulk_create(recipes)
+        ids = {
+            (author_id, name): pk
+            for author_id, name, pk in Recipe.objects.filter(
+                author_id__in={author_id for author_id, _ in new},
+                name__in={name for _, name in new}
+            ).values_list('author_id', 'name', 'pk')
+            if (author_id, name) in new
+        }
+        # bulk_create() sends no signals and sets auto_now_add fields.
+        for recipe in recipes:
+            recipe.pk = ids[recipe.author_id, recipe.name]
+            recipe.pub_date = parse_datetime(
+                new[recipe.author_id, recipe.name]['pub_date']
+            )
+            acquire(recipe.image.name)
+        Recipe.objects.bulk_update(recipes, ['pub_date'])
+        RecipeScore.objects.bulk_create([
+            RecipeScore(recipe_id=recipe.pk) for recipe in recipes
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe.pk,
+                ingredient_id=self.ingredients[
+                    item['name'], item['measurement_unit']
+                ],
+                amount=item['amount']
+            )
+            for recipe in recipes
+            for item in new[recipe.author_id, recipe.name]['ingredients']
+        ], ignore_conflicts=True)
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=self.tags[slug])
+            for recipe in recipes
+            for slug in {
+                tag['slug']
+                for tag in new[recipe.author_id, recipe.name]['tags']
+            }
+        ])
+        if recipes:
+            transaction.on_commit(
+                lambda: api_cache.invalidate('pantry'), using=self.using
+            )
+        id_map = [
+            (new[recipe.author_id, recipe.name]['id'], recipe.pk)
+            for recipe in recipes
+        ]
+        return len(recipes), len(records) - len(recipes), id_map
+
+
+def read_records(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
@@ -0,0 +1,52 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Per-request routing state set by ReplicaRoutingMiddleware.
+# Outside of a request (shell, management commands) everything
+# goes to the primary.
+routing_state = ContextVar('routing_state', default=None)
+
+PRIMARY = 'default'
+
+
+class RoutingState:
+    """
+    Whether the current request may read from a replica.
+    """
+    def __init__(self, use_primary):
+        self.use_primary = use_primary
+        self.wrote = False
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads of safe-method requests to a read replica.
+    Writes, and every read after a write in the same request,
+    go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if (
+            state is None
+            or state.use_primary
+            or not settings.DATABASE_REPLICAS
+        ):
+            return PRIMARY
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.use_primary = True
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,379 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from rest_framework.authtoken.models import Token
+
+from api import metrics
+from api.db_routers import PRIMARY
+from recipes.models import Recipe
+from users.models import Follow
+
+logger = logging.getLogger('api.events')
+
+STREAM_PATH = '/api/recipes/stream/'
+# Put in place of the queued events of a subscriber that fell behind.
+RESYNC = object()
+
+
+def recipe_event(recipe):
+    return {
+        'id': recipe.pk,
+        'author': recipe.author_id,
+        'name': recipe.name,
+        'image': recipe.image.url if recipe.image else None,
+        'pub_date': recipe.pub_date.isoformat(),
+    }
+
+
+class Subscription:
+    """
+    Recipe events for one stream, queued on its event loop. The queue
+    is bounded: when a client reads too slowly, its pending events are
+    dropped and it is told to resync.
+    """
+
+    def __init__(self, user_id, following, loop):
+        self.user_id = user_id
+        self.following = following
+        self.loop = loop
+        self.queue = asyncio.Queue(settings.EVENTS_QUEUE_SIZE)
+
+    def push(self, event):
+        """
+        Queue an event from any thread.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self.put, event)
+        except RuntimeError:
+            # The loop is closed, the stream is gone.
+            pass
+
+    def put(self, event):
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = RESYNC
+        self.queue.put_nowait(event)
+
+
+class Broker:
+    """
+    In-process pub/sub of new recipes, with subscriptions indexed by
+    the authors they follow.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_author = defaultdict(set)
+        self.subscriptions = set()
+
+    def subscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.add(subscription)
+            for author_id in subscription.following:
+                self.by_author[author_id].add(subscription)
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+            self.unindex(subscription)
+
+    def update(self, subscription, following):
+        with self.lock:
+            self.unindex(subscription)
+            subscription.following = following
+            if subscription in self.subscriptions:
+                for author_id in following:
+                    self.by_author[author_id].add(subscription)
+
+    def unindex(self, subscription):
+        for author_id in subscription.following:
+            subscribers = self.by_author.get(author_id)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.by_author[author_id]
+
+    def publish(self, event):
+        with self.lock:
+            subscribers = list(self.by_author.get(event['author'], ()))
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+
+broker = Broker()
+
+
+def publish_recipe(recipe):
+    """
+    Announce a new recipe once its transaction commits. On PostgreSQL
+    the event goes through NOTIFY, which is itself delivered on
+    commit, so streams in every process receive it; otherwise only
+    the streams of this process do.
+    """
+    event = recipe_event(recipe)
+    using = recipe._state.db
+    if connections[using].vendor == 'postgresql':
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)',
+                [settings.EVENTS_CHANNEL, json.dumps(event)]
+            )
+    else:
+        transaction.on_commit(lambda: broker.publish(event), using=using)
+
+
+class Listener(threading.Thread):
+    """
+    LISTEN for recipe events on a connection of its own and hand them
+    to the broker, reconnecting after failures.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True, name='recipe-events-listener')
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception:
+                logger.exception('Recipe event listener failed')
+                time.sleep(1)
+
+    def listen(self):
+        wrapper = connections[PRIMARY]
+        connection = wrapper.get_new_connection(
+            wrapper.get_connection_params()
+        )
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {settings.EVENTS_CHANNEL}')
+            while True:
+                select.select([connection], [], [], 5)
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    broker.publish(json.loads(notify.payload))
+        finally:
+            connection.close()
+
+
+listener = None
+listener_lock = threading.Lock()
+
+
+def start_listener():
+    """
+    Start the LISTEN thread of this process on PostgreSQL, once.
+    """
+    global listener
+    if connections[PRIMARY].vendor != 'postgresql':
+        return
+    with listener_lock:
+        if listener is None:
+            listener = Listener()
+            listener.start()
+
+
+def database(func):
+    """
+    Run a database function from async code, like a request would.
+    """
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+@database
+def authenticate(key):
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+@database
+def get_following(user_id):
+    return set(Follow.objects.filter(
+        user_id=user_id
+    ).values_list('following_id', flat=True))
+
+
+@database
+def get_missed(following, last_id):
+    """
+    Recipes the client missed while reconnecting, oldest first.
+    """
+    recipes = Recipe.objects.filter(
+        author_id__in=following, pk__gt=last_id
+    ).only(
+        'id', 'author_id', 'name', 'image', 'pub_date'
+    ).order_by('-id')[:settings.EVENTS_REPLAY_LIMIT]
+    return [recipe_event(recipe) for recipe in list(recipes)[::-1]]
+
+
+def token_key(scope):
+    """
+    The token from the Authorization header or, since EventSource can
+    not send headers, from the ``token`` cookie. Never from the query
+    string, which ends up in access logs.
+    """
+    headers = dict(scope['headers'])
+    authorization = headers.get(b'authorization', b'').decode('latin-1')
+    if authorization.startswith('Token '):
+        return authorization[len('Token '):].strip()
+    cookie = SimpleCookie(headers.get(b'cookie', b'').decode('latin-1'))
+    if 'token' in cookie:
+        return cookie['token'].value
+    return None
+
+
+def format_event(event):
+    if event is RESYNC:
+        metrics.event_stream_messages_total.inc(type='resync')
+        return b'event: resync\ndata: {}\n\n'
+    metrics.event_stream_messages_total.inc(type='recipe')
+    return (
+        f'id: {event["id"]}\nevent: recipe\n'
+        f'data: {json.dumps(event)}\n\n'
+    ).encode()
+
+
+async def reject(send, status, detail, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *headers],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps({'detail': detail}).encode(),
+    })
+
+
+async def stream_recipes(scope, receive, send):
+    """
+    Server-sent events announcing new recipes of the authors the user
+    follows. Idle streams cost a queue and a set of author ids: the
+    client gets a comment every EVENTS_HEARTBEAT seconds so that
+    proxies keep the connection open, and a ``resync`` event when it
+    reads too slowly to keep up.
+    """
+    if scope['method'] != 'GET':
+        await reject(send, 405, 'Method not allowed.', [(b'allow', b'GET')])
+        return
+    key = token_key(scope)
+    user = await authenticate(key) if key else None
+    if user is None:
+        await reject(
+            send, 401, 'Authentication credentials were not provided.'
+        )
+        return
+    if len(broker) >= settings.EVENTS_MAX_CONNECTIONS:
+        await reject(
+            send, 503, 'Too many streams.',
+            [(b'retry-after', str(settings.EVENTS_HEARTBEAT).encode())]
+        )
+        return
+    start_listener()
+    subscription = Subscription(
+        user.pk, await get_following(user.pk), asyncio.get_running_loop()
+    )
+    # Subscribe before the replay so that nothing falls in between.
+    broker.subscribe(subscription)
+    metrics.event_stream_connections.inc()
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send_chunk(send, b'retry: 5000\n\n')
+        last_id = dict(scope['headers']).get(b'last-event-id', b'')
+        if last_id.isdigit():
+            for event in await get_missed(
+                subscription.following, int(last_id)
+            ):
+                await send_chunk(send, format_event(event))
+        await pump(subscription, send, disconnected)
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(subscription)
+        metrics.event_stream_connections.dec()
+        metrics.registry.maybe_flush()
+
+
+async def pump(subscription, send, disconnected):
+    refreshed_at = time.monotonic()
+    while True:
+        get = asyncio.ensure_future(subscription.queue.get())
+        done, _ = await asyncio.wait(
+            {get, disconnected},
+            timeout=settings.EVENTS_HEARTBEAT,
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        if disconnected in done:
+            get.cancel()
+            return
+        if get.cancel():
+            await send_chunk(send, b': ping\n\n')
+        else:
+            # Awaiting send() applies the server's flow control.
+            await send_chunk(send, format_event(get.result()))
+        if time.monotonic() - refreshed_at >= settings.EVENTS_FOLLOWS_REFRESH:
+            refreshed_at = time.monotonic()
+            broker.update(
+                subscription, await get_following(subscription.user_id)
+            )
+        metrics.registry.maybe_flush()
+
+
+async def send_chunk(send, body):
+    await send({
+        'type': 'http.response.body',
+        'body': body,
+        'more_body': True,
+    })
+
+
+async def wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def with_recipe_stream(application):
+    """
+    Serve STREAM_PATH before ``application``: Django 3.2 can not
+    stream from async code.
+    """
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+            await stream_recipes(scope, receive, send)
+        else:
+            await application(scope, receive, send)
+    return router
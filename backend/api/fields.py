@@ -3,11 +3,24 @@ import base64
 from django.core.files.base import ContentFile
 from rest_framework import serializers
 
+from api.uploads import open_upload
+
+UPLOAD_PREFIX = 'upload:'
+
 
 class Base64ImageField(serializers.ImageField):
+    """
+    Image field accepting a multipart file, a base64 data URI or
+    ``upload:<token>`` of a finished resumable upload.
+    """
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+        elif isinstance(data, str) and data.startswith(UPLOAD_PREFIX):
+            data = open_upload(
+                data[len(UPLOAD_PREFIX):], self.context['request'].user
+            )
         return super().to_internal_value(data)
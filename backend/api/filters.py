@@ -1,11 +1,45 @@
+from django import forms
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, When
 from django_filters import rest_framework as filters
 
+from api.cache import api_cache
 from recipes.models import (
     Ingredient,
     Recipe,
+    RecipeIngredient,
     Tag
 )
 
+SEARCH_CONFIG = 'russian'
+
+TAGS_CACHE_TIMEOUT = 60 * 60
+
+TAGS_MATCH_ANY = 'any'
+TAGS_MATCH_ALL = 'all'
+TAGS_MATCH_CHOICES = (
+    (TAGS_MATCH_ANY, 'Any of the given tags'),
+    (TAGS_MATCH_ALL, 'All of the given tags'),
+)
+
+ORDERING_CHOICES = (
+    ('popular', 'Most popular, favourites and cart adds weigh most'),
+    ('trending', 'Most popular in the last days'),
+)
+
+
+class SlugListField(forms.MultipleChoiceField):
+    """
+    Multiple value field that accepts any slug without a choices lookup.
+    """
+    def valid_value(self, value):
+        return True
+
+
+class TagSlugFilter(filters.MultipleChoiceFilter):
+    field_class = SlugListField
+
 
 class IngredientFilter(filters.FilterSet):
     name = filters.CharFilter(field_name='name', lookup_expr='icontains')
@@ -21,15 +55,23 @@ class RecipeFilter(filters.FilterSet):
         method='filter_is_in_shopping_cart'
     )
     author = filters.NumberFilter(field_name='author__id')
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug'
+    tags = TagSlugFilter(method='filter_tags')
+    tags_match = filters.ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES,
+        method='filter_tags_match'
+    )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=ORDERING_CHOICES,
+        method='filter_ordering'
     )
 
     class Meta:
         model = Recipe
-        fields = ['is_favorited', 'is_in_shopping_cart', 'author', 'tags']
+        fields = [
+            'is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+            'tags_match', 'search', 'ordering'
+        ]
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -42,3 +84,87 @@ class RecipeFilter(filters.FilterSet):
         if value and not user.is_anonymous:
             return queryset.filter(shopping__user=user)
         return queryset
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Filter by tag slugs with one EXISTS subquery per condition, so
+        recipes are never duplicated by a join and COUNT stays exact.
+        Unknown slugs are ignored.
+        """
+        slug_map = api_cache.get_or_set(
+            'tags',
+            'slug_map',
+            lambda: dict(Tag.objects.values_list('slug', 'id')),
+            TAGS_CACHE_TIMEOUT
+        )
+        tag_ids = {slug_map[slug] for slug in value if slug in slug_map}
+        if not tag_ids:
+            return queryset.none()
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk')
+        )
+        if self.form.cleaned_data.get('tags_match') == TAGS_MATCH_ALL:
+            if len(tag_ids) < len(set(value)):
+                return queryset.none()
+            for tag_id in tag_ids:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag_id=tag_id))
+                )
+            return queryset
+        return queryset.filter(
+            Exists(recipe_tags.filter(tag_id__in=tag_ids))
+        )
+
+    def filter_tags_match(self, queryset, name, value):
+        """
+        Only selects the semantics used by ``filter_tags``.
+        """
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """
+        Search over recipe name, text and ingredient names, best matches
+        first. PostgreSQL uses the trigger-maintained ``search_vector``
+        column and its GIN index. Other backends (SQLite in tests) fall
+        back to ``icontains`` matching, ranked name > text > ingredient.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        if connections[queryset.db].vendor == 'postgresql':
+            query = SearchQuery(
+                value, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+            ).order_by('-search_rank', '-id')
+        ingredient_match = Exists(
+            RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'),
+                ingredient__name__icontains=value
+            )
+        )
+        return queryset.annotate(
+            ingredient_match=ingredient_match
+        ).filter(
+            Q(name__icontains=value)
+            | Q(text__icontains=value)
+            | Q(ingredient_match=True)
+        ).annotate(
+            search_rank=Case(
+                When(name__icontains=value, then=3),
+                When(text__icontains=value, then=2),
+                default=1,
+                output_field=IntegerField()
+            )
+        ).order_by('-search_rank', '-id')
+
+    def filter_ordering(self, queryset, name, value):
+        """
+        Order by a precomputed score, see api.popularity. Requiring the
+        score row makes the join inner, so PostgreSQL can walk the score
+        index instead of sorting the table.
+        """
+        return queryset.filter(score__isnull=False).order_by(
+            f'-score__{value}', '-id'
+        )
@@ -0,0 +1,35 @@
+from api.cache import api_cache
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def fragment_key(recipe):
+    """
+    Recipes bump ``updated_at`` on any change to themselves, their tags,
+    ingredients or author profile, so the key is versioned by it and
+    stale fragments simply expire.
+    """
+    return f'{recipe.pk}:{recipe.updated_at.timestamp()}'
+
+
+def get_fragments(recipes, render):
+    """
+    Return the cached viewer-independent representations of recipes,
+    in order. Misses are rendered together by ``render(recipes)``.
+    """
+    keys = [fragment_key(recipe) for recipe in recipes]
+    fragments = api_cache.get_many('recipe_fragments', keys)
+    missing = [
+        (key, recipe) for key, recipe in zip(keys, recipes)
+        if key not in fragments
+    ]
+    if missing:
+        rendered = dict(zip(
+            [key for key, _ in missing],
+            render([recipe for _, recipe in missing])
+        ))
+        api_cache.set_many(
+            'recipe_fragments', rendered, FRAGMENT_CACHE_TIMEOUT
+        )
+        fragments.update(rendered)
+    return [fragments[key] for key in keys]
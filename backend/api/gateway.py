@@ -0,0 +1,148 @@
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.urls import reverse
+
+from recipes.models import RecipeEvent, RecipeLink
+
+# RecipeLink.generate_unique_link() makes letters and digits only,
+# anything else, like links differing only in case, is left to Django.
+LINK_PATTERN = re.compile(r'[A-Za-z0-9]+')
+VERSION_PATTERN = re.compile(r'\$micro_cache_version \{\s*default (\d+);')
+# nginx writes the log of a minute during that minute only.
+LOG_MINUTE = 60
+
+
+def read_cache_version(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            match = VERSION_PATTERN.search(file.read())
+    except FileNotFoundError:
+        return 0
+    return int(match.group(1)) if match else 0
+
+
+def unambiguous(links):
+    """
+    Skip links that nginx can not tell apart: map matches strings
+    ignoring case, while links are case-sensitive. ``links`` must be
+    ordered case-insensitively.
+    """
+    previous, ambiguous = None, False
+    for item in links:
+        if not LINK_PATTERN.fullmatch(item[0]):
+            continue
+        if previous is not None and previous[0].lower() == item[0].lower():
+            ambiguous = True
+            continue
+        if previous is not None and not ambiguous:
+            yield previous
+        previous, ambiguous = item, False
+    if previous is not None and not ambiguous:
+        yield previous
+
+
+def write_gateway_config(path=None, purge=False):
+    """
+    Write the nginx maps included by the cached gateway config:
+    short links to recipe pages, and the version mixed into the
+    micro-cache key. With ``purge``, the version is bumped, so every
+    cached response is missed once nginx reloads the file.
+
+    The file is replaced atomically. Return (links written, version).
+    """
+    path = path or settings.GATEWAY_CONFIG
+    version = read_cache_version(path) + bool(purge)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    with tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', dir=directory, delete=False
+    ) as file:
+        try:
+            file.write(
+                '# Generated by manage.py export_gateway_config.\n'
+                'map $host $micro_cache_version {\n'
+                f'    default {version};\n'
+                '}\n'
+                'map $short_link $short_link_target {\n'
+                '    default "";\n'
+            )
+            # The page RecipeRedirectView sends clients to.
+            recipes = reverse('recipes-list').replace('/api', '')
+            links = RecipeLink.objects.exclude(link=None).order_by(
+                Lower('link')
+            ).values_list('link', 'recipe_id').iterator(chunk_size=10000)
+            for link, recipe_id in unambiguous(links):
+                file.write(f'    {link} {recipes}{recipe_id}/;\n')
+                count += 1
+            file.write('}\n')
+            file.flush()
+            os.fchmod(file.fileno(), 0o644)
+        except BaseException:
+            os.unlink(file.name)
+            raise
+    os.replace(file.name, path)
+    return count, version
+
+
+def ingest_redirect_log(path):
+    """
+    Record the short-link redirects of one gateway log as REDIRECT
+    events at the time nginx answered them. Return their number.
+    """
+    redirects = []
+    with open(path, encoding='utf-8', errors='replace') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 2 and LINK_PATTERN.fullmatch(parts[1]):
+                redirects.append((float(parts[0]), parts[1].lower()))
+    # The map matched the link ignoring case, and only holds links
+    # that are unique ignoring case.
+    recipes = dict(RecipeLink.objects.annotate(
+        lowered=Lower('link')
+    ).filter(
+        lowered__in={link for _, link in redirects}
+    ).values_list('lowered', 'recipe_id'))
+    events = [
+        RecipeEvent(
+            recipe_id=recipes[link],
+            kind=RecipeEvent.REDIRECT,
+            created_at=datetime.fromtimestamp(answered_at, timezone.utc)
+        )
+        for answered_at, link in redirects if link in recipes
+    ]
+    RecipeEvent.objects.bulk_create(events, batch_size=1000)
+    return len(events)
+
+
+def ingest_redirect_logs(directory=None):
+    """
+    Turn the per-minute logs of short links redirected by the cached
+    gateway into popularity events, and delete them. Logs written
+    within the last minute may still grow and are left for the next
+    run. Return the number of events.
+    """
+    directory = directory or settings.GATEWAY_REDIRECT_LOG_DIR
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return 0
+    count = 0
+    for name in names:
+        path = os.path.join(directory, name)
+        if (
+            not name.endswith('.log')
+            or time.time() - os.path.getmtime(path) < LOG_MINUTE
+        ):
+            continue
+        with transaction.atomic():
+            count += ingest_redirect_log(path)
+            os.remove(path)
+    return count
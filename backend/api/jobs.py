@@ -0,0 +1,176 @@
+import functools
+import logging
+import random
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    close_old_connections,
+    connection,
+    transaction
+)
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api.metrics import job_duration, jobs_total, registry
+from api.models import Job
+
+logger = logging.getLogger('api.jobs')
+
+tasks = {}
+
+
+class Task:
+    """
+    A function that can also be queued with ``delay()`` and run
+    later by ``manage.py run_workers``. Calling it runs it inline.
+    """
+
+    def __init__(self, func, max_attempts):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts
+        tasks[self.name] = self
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return self.schedule(args, kwargs)
+
+    def schedule(self, args=(), kwargs=None, countdown=0):
+        """
+        Queue a call with JSON-serializable arguments. The job is
+        part of the current transaction, so it is only seen by the
+        workers once that commits and is dropped on rollback.
+        """
+        kwargs = kwargs or {}
+        if settings.JOBS_EAGER:
+            transaction.on_commit(lambda: self.func(*args, **kwargs))
+            return None
+        return Job.objects.create(
+            task=self.name,
+            args=list(args),
+            kwargs=kwargs,
+            run_at=timezone.now() + timedelta(seconds=countdown),
+            max_attempts=self.max_attempts
+        )
+
+
+def task(func=None, *, max_attempts=None):
+    """
+    Decorator turning a function into a Task, with or without
+    arguments: ``@task`` or ``@task(max_attempts=3)``.
+    """
+    if func is None:
+        return functools.partial(task, max_attempts=max_attempts)
+    return Task(func, max_attempts or settings.JOBS_MAX_ATTEMPTS)
+
+
+def get_task(name):
+    if name not in tasks:
+        import_string(name)
+    return tasks[name]
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff with jitter, so that jobs failing together
+    do not retry together.
+    """
+    delay = min(
+        settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.JOBS_RETRY_MAX_DELAY
+    )
+    return timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+def claim_jobs(limit=1):
+    """
+    Lock due jobs and move their ``run_at`` past the lease, so that
+    a job whose worker died is picked up again once it expires.
+    On PostgreSQL, rows locked by other workers are skipped instead
+    of waited for.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.filter(failed_at=None, run_at__lte=now)
+            .order_by('run_at')
+            .select_for_update(skip_locked=True)[:limit]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                run_at=now + timedelta(seconds=settings.JOBS_LEASE),
+                attempts=F('attempts') + 1
+            )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def run_job(job):
+    started_at = time.perf_counter()
+    try:
+        get_task(job.task).func(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            outcome = 'failed'
+            Job.objects.filter(pk=job.pk).update(failed_at=now, error=error)
+        else:
+            outcome = 'retried'
+            Job.objects.filter(pk=job.pk).update(
+                run_at=now + retry_delay(job.attempts), error=error
+            )
+        logger.exception(
+            'Job %s #%s %s after %s attempts',
+            job.task, job.pk, outcome, job.attempts
+        )
+    else:
+        outcome = 'done'
+        Job.objects.filter(pk=job.pk).delete()
+    jobs_total.inc(task=job.task, outcome=outcome)
+    job_duration.observe(time.perf_counter() - started_at, task=job.task)
+    return outcome
+
+
+class Worker(threading.Thread):
+    """
+    Run due jobs one at a time until ``stopping`` is set, polling
+    every JOBS_POLL_INTERVAL seconds while the queue is empty. With
+    ``burst``, stop as soon as the queue is empty.
+    """
+
+    def __init__(self, stopping, burst=False):
+        super().__init__(daemon=True)
+        self.stopping = stopping
+        self.burst = burst
+
+    def run(self):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    jobs = claim_jobs()
+                    for job in jobs:
+                        run_job(job)
+                except DatabaseError:
+                    # The job, if any, runs again once its lease expires.
+                    logger.exception('Job queue unavailable')
+                    jobs = []
+                registry.maybe_flush()
+                if jobs:
+                    continue
+                if self.burst:
+                    break
+                self.stopping.wait(settings.JOBS_POLL_INTERVAL)
+        finally:
+            connection.close()
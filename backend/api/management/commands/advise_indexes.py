@@ -0,0 +1,368 @@
+import random
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.middleware import PRIMARY_PIN_COOKIE
+from api.sql import fingerprint
+from recipes.models import (
+    Favourite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeLink,
+    Shopping,
+    Tag
+)
+from users.models import Follow, User
+
+SEED_PREFIX = 'index_advisor_'
+FILTER_COLUMN = re.compile(r'\(?(\w+)\s*(=|<>|<=|>=|<|>|~~\*?|IS)\s')
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Call every API endpoint, EXPLAIN each SELECT it issues and '
+        'suggest indexes for sequential scans. All changes, including '
+        '--seed data, are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed this many synthetic recipes before running.'
+        )
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=1000,
+            help='Ignore sequential scans reading fewer rows than this.'
+        )
+        parser.add_argument(
+            '--user',
+            help='Email of the user to authenticate requests as.'
+        )
+
+    def handle(self, *args, **options):
+        self.vendor = connection.vendor
+        report = []
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['seed'])
+                user, recipe = self.get_fixture(options['user'])
+                if self.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+                report = self.run_endpoints(user, recipe, options['min_rows'])
+                raise Rollback
+        except Rollback:
+            pass
+        self.print_report(report)
+
+    def get_fixture(self, email):
+        users = User.objects.all()
+        if email:
+            users = users.filter(email=email)
+        elif Favourite.objects.exists():
+            users = users.filter(favourites__isnull=False)
+        user = users.order_by('id').first()
+        recipe = Recipe.objects.exclude(author=user).first()
+        if user is None or recipe is None:
+            raise CommandError(
+                'No user or recipe to run the endpoints with, use --seed.'
+            )
+        return user, recipe
+
+    def seed(self, count):
+        rng = random.Random(0)
+        authors_count = max(count // 20, 2)
+        User.objects.bulk_create([
+            User(
+                username=f'{SEED_PREFIX}{index}',
+                email=f'{SEED_PREFIX}{index}@example.com',
+                first_name='Index',
+                last_name='Advisor',
+                password='!'
+            )
+            for index in range(authors_count)
+        ], batch_size=1000)
+        users = list(User.objects.filter(username__startswith=SEED_PREFIX))
+        Tag.objects.bulk_create([
+            Tag(name=f'{SEED_PREFIX}{index}', slug=f'{SEED_PREFIX}{index}')
+            for index in range(8)
+        ])
+        tags = list(Tag.objects.filter(slug__startswith=SEED_PREFIX))
+        Ingredient.objects.bulk_create([
+            Ingredient(
+                name=f'{SEED_PREFIX}{index}',
+                measurement_unit=Ingredient.ГРАММЫ
+            )
+            for index in range(500)
+        ], batch_size=1000)
+        ingredients = list(
+            Ingredient.objects.filter(name__startswith=SEED_PREFIX)
+            .values_list('id', flat=True)
+        )
+        Recipe.objects.bulk_create([
+            Recipe(
+                author=users[index % len(users)],
+                name=f'{SEED_PREFIX}{index}',
+                text='Рецепт для проверки индексов',
+                cooking_time=rng.randint(1, 120)
+            )
+            for index in range(count)
+        ], batch_size=1000)
+        recipes = list(
+            Recipe.objects.filter(name__startswith=SEED_PREFIX)
+            .values_list('id', flat=True)
+        )
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=rng.randint(1, 500)
+            )
+            for recipe_id in recipes
+            for ingredient_id in rng.sample(ingredients, 8)
+        ], batch_size=5000)
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+            for recipe_id in recipes
+            for tag in rng.sample(tags, 2)
+        ], batch_size=5000)
+        for model, per_user in ((Favourite, 20), (Shopping, 5)):
+            model.objects.bulk_create([
+                model(user=user, recipe_id=recipe_id)
+                for user in users
+                for recipe_id in rng.sample(recipes, min(per_user, count))
+            ], batch_size=5000)
+        Follow.objects.bulk_create([
+            Follow(user=user, following=following)
+            for user in users
+            for following in rng.sample(users, min(5, len(users)))
+            if following != user
+        ], batch_size=5000)
+
+    def get_endpoints(self, user, recipe):
+        tags = list(
+            recipe.tags.values_list('slug', flat=True)
+        ) or ['breakfast']
+        tag_query = '&'.join(f'tags={slug}' for slug in tags)
+        ingredient = recipe.ingredients.first()
+        word = (ingredient.name if ingredient else recipe.name)[:4]
+        return [
+            ('recipes.list', 'get', '/api/recipes/'),
+            ('recipes.list', 'get', f'/api/recipes/?{tag_query}'),
+            (
+                'recipes.list', 'get',
+                f'/api/recipes/?{tag_query}&tags_match=all'
+            ),
+            (
+                'recipes.list', 'get',
+                f'/api/recipes/?author={recipe.author_id}'
+            ),
+            ('recipes.list', 'get', '/api/recipes/?is_favorited=1'),
+            ('recipes.list', 'get', '/api/recipes/?is_in_shopping_cart=1'),
+            ('recipes.list', 'get', f'/api/recipes/?search={word}'),
+            ('recipes.retrieve', 'get', f'/api/recipes/{recipe.id}/'),
+            (
+                'recipes.get_short_link', 'get',
+                f'/api/recipes/{recipe.id}/get-link/'
+            ),
+            (
+                'recipe-redirect', 'get',
+                lambda: '/api/s/{}/'.format(
+                    RecipeLink.objects.get_or_create(recipe=recipe)[0].link
+                )
+            ),
+            (
+                'recipes.download_shopping_cart', 'get',
+                '/api/recipes/download_shopping_cart/'
+            ),
+            (
+                'recipes.add_to_delete_from_favourites', 'post',
+                f'/api/recipes/{recipe.id}/favorite/'
+            ),
+            (
+                'recipes.add_to_delete_from_favourites', 'delete',
+                f'/api/recipes/{recipe.id}/favorite/'
+            ),
+            (
+                'recipes.add_to_delete_from_shopping_cart', 'post',
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            ),
+            (
+                'recipes.add_to_delete_from_shopping_cart', 'delete',
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            ),
+            ('users.list', 'get', '/api/users/'),
+            ('users.retrieve', 'get', f'/api/users/{recipe.author_id}/'),
+            ('users.me', 'get', '/api/users/me/'),
+            ('users.list_subscriptions', 'get', '/api/users/subscriptions/'),
+            (
+                'users.subscribe', 'post',
+                f'/api/users/{recipe.author_id}/subscribe/'
+            ),
+            (
+                'users.subscribe', 'delete',
+                f'/api/users/{recipe.author_id}/subscribe/'
+            ),
+            ('tags.list', 'get', '/api/tags/'),
+            ('ingredients.list', 'get', f'/api/ingredients/?name={word}'),
+        ]
+
+    def run_endpoints(self, user, recipe, min_rows):
+        host = next(
+            (
+                host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                if host != '*'
+            ),
+            'localhost'
+        )
+        client = APIClient(HTTP_HOST=host)
+        client.force_authenticate(user)
+        # Replicas cannot see the rolled-back seed data.
+        client.cookies[PRIMARY_PIN_COOKIE] = '1'
+        explained = {}
+        report = []
+        for action, method, path in self.get_endpoints(user, recipe):
+            if callable(path):
+                path = path()
+            with CaptureQueriesContext(connection) as context:
+                response = getattr(client, method)(path)
+            findings = []
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                key = fingerprint(sql)
+                if key not in explained:
+                    explained[key] = self.explain(sql, min_rows)
+                findings.extend(
+                    dict(finding, fingerprint=key)
+                    for finding in explained[key]
+                )
+            report.append({
+                'action': action,
+                'method': method.upper(),
+                'path': path,
+                'status': response.status_code,
+                'queries': len(context.captured_queries),
+                'findings': findings,
+            })
+        return report
+
+    def explain(self, sql, min_rows):
+        with connection.cursor() as cursor:
+            if self.vendor == 'postgresql':
+                cursor.execute(
+                    'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql
+                )
+                plan = cursor.fetchone()[0][0]['Plan']
+                return self.postgresql_findings(plan, min_rows)
+            if self.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                return self.sqlite_findings(cursor.fetchall())
+        return []
+
+    def postgresql_findings(self, plan, min_rows):
+        findings = []
+        nodes = [plan]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', []))
+            if node['Node Type'] != 'Seq Scan':
+                continue
+            loops = node.get('Actual Loops', 1)
+            rows_read = loops * (
+                node.get('Actual Rows', 0)
+                + node.get('Rows Removed by Filter', 0)
+            )
+            if rows_read < min_rows:
+                continue
+            table = node['Relation Name']
+            condition = node.get('Filter', '')
+            findings.append({
+                'table': table,
+                'rows_read': rows_read,
+                'buffers': (
+                    node.get('Shared Hit Blocks', 0)
+                    + node.get('Shared Read Blocks', 0)
+                ),
+                'condition': condition,
+                'suggestion': self.suggest_index(table, condition),
+            })
+        return findings
+
+    def sqlite_findings(self, rows):
+        findings = []
+        for row in rows:
+            match = SQLITE_SCAN.match(row[-1])
+            if match:
+                findings.append({
+                    'table': match.group(1),
+                    'rows_read': None,
+                    'buffers': None,
+                    'condition': row[-1],
+                    'suggestion': None,
+                })
+        return findings
+
+    def suggest_index(self, table, condition):
+        """
+        Equality columns first, then range and pattern columns.
+        """
+        equality = []
+        other = []
+        for column, operator in FILTER_COLUMN.findall(condition):
+            target = equality if operator == '=' else other
+            if column not in equality + other:
+                target.append(column)
+        columns = equality + other
+        if not columns:
+            return None
+        return f'CREATE INDEX ON {table} ({", ".join(columns)});'
+
+    def print_report(self, report):
+        suggestions = {}
+        for entry in report:
+            self.stdout.write(
+                f'{entry["action"]} {entry["method"]} {entry["path"]} '
+                f'-> {entry["status"]}, {entry["queries"]} queries, '
+                f'{len(entry["findings"])} sequential scans'
+            )
+            for finding in entry['findings']:
+                details = f'    seq scan on {finding["table"]}'
+                if finding['rows_read'] is not None:
+                    details += (
+                        f' ({finding["rows_read"]} rows, '
+                        f'{finding["buffers"]} buffers)'
+                    )
+                if finding['condition']:
+                    details += f': {finding["condition"]}'
+                self.stdout.write(self.style.WARNING(details))
+                self.stdout.write(f'      {finding["fingerprint"][:200]}')
+                if finding['suggestion']:
+                    suggestions.setdefault(
+                        finding['suggestion'], set()
+                    ).add(entry['action'])
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS('No indexes to suggest.'))
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING('Suggested indexes:'))
+        for suggestion, actions in sorted(suggestions.items()):
+            self.stdout.write(
+                f'  {suggestion}  -- {", ".join(sorted(actions))}'
+            )
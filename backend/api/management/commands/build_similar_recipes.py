@@ -0,0 +1,109 @@
+import resource
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.similarity import (
+    BLOCK_CELLS,
+    build_matrix,
+    build_similar,
+    neighbours
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Precompute the most similar recipes of every recipe by shared '
+        'ingredients and tags. With --benchmark, time the computation '
+        'on a synthetic corpus instead, without touching the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--block-cells',
+            type=int,
+            default=BLOCK_CELLS,
+            help='Size of the dense similarity block, in floats.'
+        )
+        parser.add_argument(
+            '--benchmark',
+            type=int,
+            metavar='RECIPES',
+            help='Size of the synthetic corpus to benchmark on.'
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=2000,
+            help='Number of distinct ingredients in the benchmark.'
+        )
+        parser.add_argument(
+            '--per-recipe',
+            type=int,
+            default=8,
+            help='Ingredients per recipe in the benchmark.'
+        )
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self.benchmark(
+                options['benchmark'],
+                options['ingredients'],
+                options['per_recipe'],
+                options['block_cells']
+            )
+            return
+        started_at = time.perf_counter()
+        stored = build_similar(block_cells=options['block_cells'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {stored} neighbours in '
+            f'{time.perf_counter() - started_at:.1f} s.'
+        ))
+
+    def benchmark(self, count, ingredients, per_recipe, block_cells):
+        """
+        Ingredient popularity follows a Zipf law, like salt and
+        sugar in real recipes, which is the expensive case.
+        """
+        rng = np.random.default_rng(0)
+        popularity = 1 / np.arange(1, ingredients + 1)
+        popularity /= popularity.sum()
+        recipe_ids = np.arange(1, count + 1)
+        ingredient_pairs = np.column_stack([
+            np.repeat(recipe_ids, per_recipe),
+            rng.choice(ingredients, size=count * per_recipe, p=popularity),
+        ])
+        ingredient_pairs = np.unique(ingredient_pairs, axis=0)
+        tag_pairs = np.column_stack([
+            np.repeat(recipe_ids, 2),
+            rng.integers(0, 20, size=count * 2),
+        ])
+        tag_pairs = np.unique(tag_pairs, axis=0)
+        started_at = time.perf_counter()
+        matrix, weights = build_matrix(
+            recipe_ids,
+            ingredient_pairs,
+            tag_pairs,
+            settings.SIMILAR_RECIPES_TAG_WEIGHT
+        )
+        built_at = time.perf_counter()
+        stored = 0
+        for rows, _, _ in neighbours(
+            matrix,
+            weights,
+            settings.SIMILAR_RECIPES_COUNT,
+            settings.SIMILAR_RECIPES_METRIC,
+            block_cells
+        ):
+            stored += len(rows)
+        finished_at = time.perf_counter()
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            f'{count} recipes, {matrix.nnz} recipe features: matrix '
+            f'{built_at - started_at:.2f} s, neighbours '
+            f'{finished_at - built_at:.2f} s '
+            f'({count / (finished_at - built_at):.0f} recipes/s), '
+            f'{stored} neighbours, peak RSS {peak:.0f} MiB.'
+        )
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.gateway import write_gateway_config
+
+
+class Command(BaseCommand):
+    help = (
+        'Write recipe short links to an nginx map, so that the cached '
+        'gateway redirects them without reaching Django. The gateway '
+        'reloads the file when it changes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=settings.GATEWAY_CONFIG,
+            help='File included by the gateway config.'
+        )
+        parser.add_argument(
+            '--purge',
+            action='store_true',
+            help='Also drop every micro-cached API response.'
+        )
+
+    def handle(self, *args, **options):
+        count, version = write_gateway_config(
+            options['output'], options['purge']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {count} short links to {options["output"]}, '
+            f'micro-cache version {version}.'
+        ))
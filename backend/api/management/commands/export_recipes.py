@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.corpus import Progress, export_recipes, open_stream
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream all recipes with their ingredients, tags and author '
+        'as NDJSON, one recipe per line, for import_recipes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            nargs='?',
+            default='-',
+            help='Output file, "-" for stdout. Gzipped if it ends with .gz.'
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            default=None,
+            help='Gzip the output whatever its name.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Recipes read from the database at a time.'
+        )
+
+    def handle(self, *args, **options):
+        progress = Progress(self.stderr, 'recipes')
+        queryset = Recipe.objects.defer('search_vector')
+        with open_stream(options['output'], 'w', options['gzip']) as output:
+            for record in export_recipes(queryset, options['chunk_size']):
+                output.write(json.dumps(record, ensure_ascii=False))
+                output.write('\n')
+                progress.add(done=1)
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {progress.summary()}.'
+        ))
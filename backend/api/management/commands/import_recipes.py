@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+
+from api.corpus import (
+    Progress,
+    RecipeImporter,
+    chunked,
+    open_stream,
+    read_records
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Load recipes written by export_recipes. Recipes get new ids; '
+        'authors are matched by email, ingredients by name and unit and '
+        'tags by slug. Recipes an author already has are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            nargs='?',
+            default='-',
+            help='Input file, "-" for stdin. Gunzipped if it ends with .gz.'
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            default=None,
+            help='Gunzip the input whatever its name.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Recipes inserted per transaction.'
+        )
+        parser.add_argument(
+            '--skip-missing-authors',
+            action='store_true',
+            help='Skip recipes of unknown authors instead of creating '
+                 'them with unusable passwords.'
+        )
+        parser.add_argument(
+            '--id-map',
+            help='Write "exported id,new id" lines to this file.'
+        )
+
+    def handle(self, *args, **options):
+        importer = RecipeImporter(
+            create_authors=not options['skip_missing_authors']
+        )
+        progress = Progress(self.stderr, 'records')
+        id_map = open(options['id_map'], 'w') if options['id_map'] else None
+        try:
+            with open_stream(options['input'], 'r', options['gzip']) as file:
+                for batch in chunked(
+                    read_records(file), options['batch_size']
+                ):
+                    imported, skipped, ids = importer.import_batch(batch)
+                    if id_map:
+                        id_map.writelines(
+                            f'{old},{new}\n' for old, new in ids
+                        )
+                    progress.add(
+                        done=len(batch), imported=imported, skipped=skipped
+                    )
+        finally:
+            if id_map:
+                id_map.close()
+        self.stderr.write(self.style.SUCCESS(
+            f'Imported {progress.summary()}. Run build_similar_recipes '
+            f'to add the new recipes to similar recipes.'
+        ))
@@ -0,0 +1,79 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.jobs import Worker
+from api.metrics import registry
+
+
+def run_threads(threads, burst):
+    """
+    Run ``threads`` workers in this process until SIGTERM or SIGINT,
+    letting every worker finish its current job.
+    """
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stopping.set())
+    workers = [Worker(stopping, burst) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        while worker.is_alive():
+            worker.join(timeout=1)
+    if registry.multiproc_dir:
+        registry.flush()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs, see api.jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.JOBS_PROCESSES,
+            help='Worker processes, for CPU-bound tasks.'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=settings.JOBS_THREADS,
+            help='Worker threads per process, for tasks waiting on I/O.'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once the queue has no due jobs.'
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        threads = options['threads']
+        self.stdout.write(f'Running {processes} x {threads} workers.')
+        if processes == 1:
+            run_threads(threads, options['burst'])
+            return
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [
+            context.Process(
+                target=run_threads, args=(threads, options['burst'])
+            )
+            for _ in range(processes)
+        ]
+        for child in children:
+            child.start()
+
+        def stop(*args):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for child in children:
+            child.join()
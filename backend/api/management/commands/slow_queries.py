@@ -0,0 +1,98 @@
+import json
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Summarize the slow-query log: top query fingerprints by total '
+        'time with the view actions and code that issued them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'log',
+            nargs='?',
+            default=settings.SLOW_QUERY_LOG,
+            help='Log file, "-" for stdin. Defaults to SLOW_QUERY_LOG.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Number of fingerprints to show.'
+        )
+        parser.add_argument(
+            '--action',
+            help='Only count queries of this view action.'
+        )
+        parser.add_argument(
+            '--by',
+            choices=('fingerprint', 'frame', 'action'),
+            default='fingerprint',
+            help='Group queries by fingerprint, code location or action.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['log']:
+            raise CommandError('Pass a log file or set SLOW_QUERY_LOG.')
+        if options['log'] == '-':
+            groups = self.aggregate(sys.stdin, options)
+        else:
+            try:
+                with open(options['log'], encoding='utf-8') as log:
+                    groups = self.aggregate(log, options)
+            except OSError as error:
+                raise CommandError(error)
+        self.print_report(groups, options['limit'], options['by'])
+
+    def aggregate(self, lines, options):
+        groups = {}
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if options['action'] and record['action'] != options['action']:
+                continue
+            group = groups.setdefault(record[options['by']], {
+                'total': 0,
+                'count': 0,
+                'max': 0,
+                'fingerprints': Counter(),
+                'frames': Counter(),
+                'actions': Counter(),
+            })
+            duration = record['duration_ms']
+            group['total'] += duration
+            group['count'] += 1
+            group['max'] = max(group['max'], duration)
+            group['fingerprints'][record['fingerprint']] += duration
+            group['frames'][record['frame']] += duration
+            group['actions'][record['action']] += duration
+        return groups
+
+    def print_report(self, groups, limit, by):
+        if not groups:
+            self.stdout.write(self.style.SUCCESS('No slow queries logged.'))
+            return
+        ranked = sorted(
+            groups.items(), key=lambda item: item[1]['total'], reverse=True
+        )
+        for key, group in ranked[:limit]:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{group["total"]:.0f} ms total, {group["count"]} queries, '
+                f'{group["total"] / group["count"]:.1f} ms avg, '
+                f'{group["max"]:.1f} ms max'
+            ))
+            self.stdout.write(f'  {key[:300]}')
+            for name in ('frames', 'actions', 'fingerprints'):
+                if name.startswith(by):
+                    continue
+                for value, total in group[name].most_common(3):
+                    self.stdout.write(
+                        f'    {total:.0f} ms  {name[:-1]} {value[:200]}'
+                    )
@@ -0,0 +1,397 @@
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from api.cache import api_cache
+from api.models import Job
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+CACHE_HIT_EVENTS = ('hits', 'shared_hits', 'stale_hits')
+
+
+class Metric:
+    """
+    Base class for metrics updated without locks: every thread writes
+    to its own store, and stores are only merged on scrape.
+    """
+    type = None
+
+    def __init__(self, name, documentation, registry):
+        self.name = name
+        self.documentation = documentation
+        self.local = threading.local()
+        self.stores = []
+        self.stores_lock = threading.Lock()
+        registry.register(self)
+
+    def store(self):
+        store = getattr(self.local, 'store', None)
+        if store is None:
+            store = self.local.store = {}
+            with self.stores_lock:
+                self.stores.append(store)
+        return store
+
+    def collect(self):
+        """
+        Return {labels: value} merged over all threads.
+        """
+        with self.stores_lock:
+            stores = [dict(store) for store in self.stores]
+        samples = {}
+        for store in stores:
+            for labels, value in store.items():
+                samples[labels] = self.merge(samples.get(labels), value)
+        return samples
+
+    def merge(self, first, second):
+        if first is None:
+            return second
+        return first + second
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        store = self.store()
+        key = tuple(sorted(labels.items()))
+        store[key] = store.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, registry,
+                 buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, registry)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        store = self.store()
+        key = tuple(sorted(labels.items()))
+        sample = store.get(key)
+        if sample is None:
+            sample = store[key] = [[0] * len(self.buckets), 0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                sample[0][index] += 1
+                break
+        sample[1] += value
+        sample[2] += 1
+
+    def collect(self):
+        with self.stores_lock:
+            stores = list(self.stores)
+        samples = {}
+        for store in stores:
+            for labels, value in list(store.items()):
+                value = [list(value[0]), value[1], value[2]]
+                samples[labels] = self.merge(samples.get(labels), value)
+        return samples
+
+    def merge(self, first, second):
+        if first is None:
+            return second
+        return [
+            [a + b for a, b in zip(first[0], second[0])],
+            first[1] + second[1],
+            first[2] + second[2],
+        ]
+
+
+class Registry:
+    """
+    Metrics of this process. With METRICS_MULTIPROC_DIR set, every
+    worker periodically writes its snapshot to <dir>/<pid>.json and
+    a scrape of any worker merges all snapshots. Gauges of workers
+    that are no longer running are dropped.
+    """
+
+    def __init__(self, multiproc_dir=None, flush_interval=1):
+        self.metrics = []
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        self.flushed_at = 0
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def snapshot(self):
+        snapshot = {}
+        for metric in self.metrics:
+            snapshot[metric.name] = {
+                'type': metric.type,
+                'help': metric.documentation,
+                'buckets': list(getattr(metric, 'buckets', ()))[:-1],
+                'samples': [
+                    [list(labels), value]
+                    for labels, value in metric.collect().items()
+                ],
+            }
+        snapshot['api_cache_events_total'] = {
+            'type': 'counter',
+            'help': 'Two-tier API cache events by namespace.',
+            'buckets': [],
+            'samples': [
+                [[['event', event], ['namespace', namespace]], value]
+                for namespace, events in api_cache.stats().items()
+                for event, value in events.items()
+            ],
+        }
+        return snapshot
+
+    def maybe_flush(self):
+        if not self.multiproc_dir:
+            return
+        now = time.monotonic()
+        if now - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.flushed_at = time.monotonic()
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        path = os.path.join(self.multiproc_dir, f'{os.getpid()}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, path)
+
+    def snapshots(self):
+        if not self.multiproc_dir:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.multiproc_dir, '*.json')):
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if not pid_alive(int(os.path.basename(path).split('.')[0])):
+                snapshot = {
+                    name: data for name, data in snapshot.items()
+                    if data['type'] != 'gauge'
+                }
+            snapshots.append(snapshot)
+        return snapshots
+
+    def merged(self):
+        merged = {}
+        for snapshot in self.snapshots():
+            for name, data in snapshot.items():
+                metric = merged.setdefault(name, dict(data, samples={}))
+                for labels, value in data['samples']:
+                    key = tuple(tuple(pair) for pair in labels)
+                    previous = metric['samples'].get(key)
+                    if previous is None:
+                        metric['samples'][key] = value
+                    elif data['type'] == 'histogram':
+                        metric['samples'][key] = [
+                            [a + b for a, b in zip(previous[0], value[0])],
+                            previous[1] + value[1],
+                            previous[2] + value[2],
+                        ]
+                    else:
+                        metric['samples'][key] = previous + value
+        add_cache_hit_ratio(merged)
+        add_job_queue_depth(merged)
+        return merged
+
+    def exposition(self):
+        """
+        Render all metrics in the Prometheus text format.
+        """
+        lines = []
+        for name, data in sorted(self.merged().items()):
+            lines.append(f'# HELP {name} {data["help"]}')
+            lines.append(f'# TYPE {name} {data["type"]}')
+            for labels, value in sorted(data['samples'].items()):
+                if data['type'] != 'histogram':
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+                    continue
+                buckets, total, count = value
+                cumulative = 0
+                for bound, bucket in zip(
+                    data['buckets'] + ['+Inf'], buckets
+                ):
+                    cumulative += bucket
+                    bucket_labels = labels + (('le', str(bound)),)
+                    lines.append(
+                        f'{name}_bucket{format_labels(bucket_labels)} '
+                        f'{cumulative}'
+                    )
+                lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def add_cache_hit_ratio(merged):
+    totals = {}
+    events = merged.get('api_cache_events_total', {}).get('samples', {})
+    for labels, value in events.items():
+        labels = dict(labels)
+        hits, lookups = totals.get(labels['namespace'], (0, 0))
+        if labels['event'] in CACHE_HIT_EVENTS:
+            hits += value
+            lookups += value
+        elif labels['event'] == 'misses':
+            lookups += value
+        totals[labels['namespace']] = (hits, lookups)
+    merged['api_cache_hit_ratio'] = {
+        'type': 'gauge',
+        'help': 'Share of API cache lookups answered from the cache.',
+        'buckets': [],
+        'samples': {
+            (('namespace', namespace),): hits / lookups
+            for namespace, (hits, lookups) in totals.items() if lookups
+        },
+    }
+
+
+def add_job_queue_depth(merged):
+    """
+    Queue depth is read from the database at scrape time, so it is
+    not part of the per-process snapshots that get summed.
+    """
+    now = timezone.now()
+    pending = Q(failed_at=None)
+    ready = pending & Q(run_at__lte=now)
+    depth = Job.objects.values('task').annotate(
+        ready=Count('pk', filter=ready),
+        scheduled=Count('pk', filter=pending & Q(run_at__gt=now)),
+        failed=Count('pk', filter=Q(failed_at__isnull=False))
+    )
+    merged['jobs_queued'] = {
+        'type': 'gauge',
+        'help': 'Queued jobs by task and state; scheduled includes '
+                'running and retrying jobs.',
+        'buckets': [],
+        'samples': {
+            (('state', state), ('task', row['task'])): row[state]
+            for row in depth
+            for state in ('ready', 'scheduled', 'failed')
+        },
+    }
+    oldest = Job.objects.filter(ready).aggregate(oldest=Min('run_at'))
+    merged['jobs_oldest_ready_seconds'] = {
+        'type': 'gauge',
+        'help': 'How long the oldest due job has been waiting.',
+        'buckets': [],
+        'samples': {
+            (): (now - oldest['oldest']).total_seconds()
+            if oldest['oldest'] else 0
+        },
+    }
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+def pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = Registry(multiproc_dir=settings.METRICS_MULTIPROC_DIR)
+if registry.multiproc_dir:
+    atexit.register(registry.flush)
+
+requests_in_flight = Gauge(
+    'http_requests_in_flight',
+    'Requests being processed.',
+    registry
+)
+requests_total = Counter(
+    'http_requests_total',
+    'Processed requests by view action, method and status.',
+    registry
+)
+request_duration = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by view action.',
+    registry
+)
+response_size = Histogram(
+    'http_response_size_bytes',
+    'Response body size by view action.',
+    registry,
+    buckets=SIZE_BUCKETS
+)
+db_queries = Histogram(
+    'db_queries_per_request',
+    'Database queries issued per request by view action.',
+    registry,
+    buckets=QUERY_COUNT_BUCKETS
+)
+batch_requests_total = Counter(
+    'http_batch_requests_total',
+    'Sub-requests of /api/batch/ by view action, method and status.',
+    registry
+)
+event_stream_connections = Gauge(
+    'event_stream_connections',
+    'Open recipe event streams.',
+    registry
+)
+event_stream_messages_total = Counter(
+    'event_stream_messages_total',
+    'Messages sent on recipe event streams by type: recipe or resync.',
+    registry
+)
+throttled_requests_total = Counter(
+    'throttled_requests_total',
+    'Requests rejected by rate limits, by throttle scope and view action.',
+    registry
+)
+jobs_total = Counter(
+    'jobs_total',
+    'Job runs by task and outcome: done, retried or failed.',
+    registry
+)
+job_duration = Histogram(
+    'job_duration_seconds',
+    'Job run time by task.',
+    registry
+)
+db_duration = Histogram(
+    'db_query_duration_seconds',
+    'Total database time per request by view action.',
+    registry
+)
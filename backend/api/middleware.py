@@ -0,0 +1,185 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+from api import metrics
+from api.db_routers import RoutingState, routing_state
+from api.profiling import RequestProfiler
+from api.slow_queries import SlowQueryLogger
+
+PRIMARY_PIN_COOKIE = 'db_primary_pin'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let safe-method requests read from replicas, unless the client
+    has written something within the last DATABASE_PRIMARY_PIN_SECONDS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState(
+            use_primary=(
+                request.method not in SAFE_METHODS
+                or PRIMARY_PIN_COOKIE in request.COOKIES
+            )
+        )
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        if (
+            state.wrote
+            and settings.DATABASE_REPLICAS
+            and settings.DATABASE_PRIMARY_PIN_SECONDS
+        ):
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE,
+                '1',
+                max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+
+def view_action(request, view_func):
+    """
+    Name the view handling a request after its router basename and
+    action, e.g. ``recipes.list``, or after the URL name otherwise.
+    """
+    initkwargs = getattr(view_func, 'initkwargs', {})
+    actions = getattr(view_func, 'actions', None)
+    if actions and 'basename' in initkwargs:
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{initkwargs["basename"]}.{action}'
+    match = request.resolver_match
+    if match is not None and match.url_name:
+        return match.url_name
+    return getattr(view_func, '__name__', 'unknown')
+
+
+class QueryTimer:
+    """
+    Execute wrapper counting queries and their total duration, and
+    passing the slow ones to ``slow_queries``, a SlowQueryLogger.
+    """
+
+    def __init__(self, slow_queries=None):
+        self.count = 0
+        self.duration = 0
+        self.slow_queries = slow_queries
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if (
+                self.slow_queries is not None
+                and duration >= self.slow_queries.threshold
+            ):
+                self.slow_queries.log(sql, duration, context)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status, response size and database usage of
+    every request, labelled with the DRF view action, and log queries
+    slower than SLOW_QUERY_THRESHOLD_MS with the view action and the
+    project code that issued them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        timer = QueryTimer(
+            None if threshold is None
+            else SlowQueryLogger(request, threshold / 1000)
+        )
+        metrics.requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            metrics.requests_in_flight.dec()
+        duration = time.perf_counter() - start
+        action = getattr(request, 'view_action', 'unmatched')
+        metrics.requests_total.inc(
+            action=action,
+            method=request.method,
+            status=response.status_code
+        )
+        metrics.request_duration.observe(duration, action=action)
+        if not response.streaming:
+            metrics.response_size.observe(
+                len(response.content), action=action
+            )
+        metrics.db_queries.observe(timer.count, action=action)
+        metrics.db_duration.observe(timer.duration, action=action)
+        metrics.registry.maybe_flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_action = view_action(request, view_func)
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests of staff users sending ``X-Profile: 1`` or
+    ``?profile=1``, and a PROFILING_SAMPLE_RATE share of all requests.
+    Other requests only pay for a header lookup and a random number.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = False
+        if not self.requested(request) or not self.is_staff(request):
+            sampled = random.random() < settings.PROFILING_SAMPLE_RATE
+            if not sampled:
+                return self.get_response(request)
+        with RequestProfiler() as profiler:
+            response = self.get_response(request)
+        profile = profiler.save(
+            request, getattr(request, 'view_action', 'unmatched'), sampled
+        )
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    def requested(self, request):
+        return (
+            request.META.get('HTTP_X_PROFILE') == '1'
+            or request.GET.get('profile') == '1'
+        )
+
+    def is_staff(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            try:
+                credentials = TokenAuthentication().authenticate(request)
+            except AuthenticationFailed:
+                credentials = None
+            user = credentials[0] if credentials else None
+        if user is None or not user.is_staff:
+            return False
+        request.profiling_user = user
+        return True
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:58
+
+import api.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(db_index=True, max_length=255, verbose_name='View action')),
+                ('method', models.CharField(max_length=10, verbose_name='Method')),
+                ('path', models.CharField(max_length=2048, verbose_name='Path')),
+                ('duration', models.FloatField(verbose_name='Duration (ms)')),
+                ('sampled', models.BooleanField(default=False, verbose_name='Random sample')),
+                ('stats_file', models.FileField(storage=api.models.get_profile_storage, upload_to='', verbose_name='pstats file')),
+                ('stacks_file', models.FileField(storage=api.models.get_profile_storage, upload_to='', verbose_name='Collapsed stacks')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Request profile',
+                'verbose_name_plural': 'Request profiles',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:01
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    """
+    Existing files get reference counts too, so releasing them
+    deletes the file once nothing uses it.
+    """
+    MediaBlob = apps.get_model('api', 'MediaBlob')
+    references = Counter()
+    for model, field in (('recipes.Recipe', 'image'), ('users.User', 'avatar')):
+        references.update(
+            apps.get_model(model).objects.exclude(**{field: ''})
+            .exclude(**{f'{field}__isnull': True})
+            .values_list(field, flat=True).iterator()
+        )
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, refs=refs) for name, refs in references.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+        ('recipes', '0006_recipe_updated_at'),
+        ('users', '0002_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='File name')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='References')),
+            ],
+            options={
+                'verbose_name': 'Media blob',
+                'verbose_name_plural': 'Media blobs',
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
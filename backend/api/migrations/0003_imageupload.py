@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0002_mediablob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Token')),
+                ('filename', models.CharField(max_length=255, verbose_name='File name')),
+                ('size', models.PositiveIntegerField(verbose_name='Size')),
+                ('offset', models.PositiveIntegerField(default=0, verbose_name='Received bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Created')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Image upload',
+                'verbose_name_plural': 'Image uploads',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_imageupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=255, verbose_name='Task')),
+                ('args', models.JSONField(default=list, verbose_name='Arguments')),
+                ('kwargs', models.JSONField(default=dict, verbose_name='Keyword arguments')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Run at')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('max_attempts', models.PositiveSmallIntegerField(verbose_name='Max attempts')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+                ('failed_at', models.DateTimeField(blank=True, null=True, verbose_name='Failed')),
+                ('error', models.TextField(blank=True, verbose_name='Last error')),
+            ],
+            options={
+                'verbose_name': 'Job',
+                'verbose_name_plural': 'Jobs',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('failed_at', None)), fields=['run_at'], name='job_pending_idx'),
+        ),
+    ]
@@ -1,10 +1,17 @@
+from django.http import Http404
 from rest_framework import status
 from rest_framework.response import Response
 
+from api.popularity import record_event
+from api.sql import insert_ignore
+
 
 class AddRemoveMixin:
     """
     Mixin to add or remove a recipe to/from a related model.
+    Both directions are a single write statement relying on
+    the model's unique (user, recipe) constraint. Additions are
+    recorded as ``event`` for the popularity scores.
     """
     def add_or_remove(
         self,
@@ -12,16 +19,14 @@ class AddRemoveMixin:
         model,
         serializer_class,
         add_message,
-        remove_message
+        remove_message,
+        event
     ):
-        recipe = self.get_object()
         user = request.user
         if request.method == 'POST':
-            _, created = model.objects.get_or_create(
-                user=user,
-                recipe=recipe
-            )
-            if created:
+            recipe = self.get_object()
+            if insert_ignore(model, user=user, recipe=recipe):
+                record_event(recipe.pk, event)
                 serializer = serializer_class(recipe)
                 return Response(
                     serializer.data,
@@ -32,10 +37,18 @@ class AddRemoveMixin:
                 status=status.HTTP_400_BAD_REQUEST
             )
         elif request.method == 'DELETE':
-            instance = model.objects.filter(user=user, recipe=recipe)
-            if instance.exists():
-                instance.delete()
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            recipe_id = self.kwargs[lookup_url_kwarg]
+            if not recipe_id.isdigit():
+                raise Http404
+            deleted, _ = model.objects.filter(
+                user=user,
+                recipe_id=recipe_id
+            ).delete()
+            if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
+            if not self.get_queryset().filter(pk=recipe_id).exists():
+                raise Http404
             return Response(
                 {"detail": remove_message},
                 status=status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,196 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils import timezone
+
+
+def get_profile_storage():
+    """
+    Profiles are kept outside MEDIA_ROOT, which nginx serves publicly.
+    """
+    return FileSystemStorage(location=settings.PROFILING_DIR)
+
+
+class RequestProfile(models.Model):
+    """
+    Model for profiles of single API requests.
+    """
+    action = models.CharField(
+        max_length=255,
+        db_index=True,
+        verbose_name='View action',
+    )
+    method = models.CharField(
+        max_length=10,
+        verbose_name='Method',
+    )
+    path = models.CharField(
+        max_length=2048,
+        verbose_name='Path',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='User',
+    )
+    duration = models.FloatField(
+        verbose_name='Duration (ms)',
+    )
+    sampled = models.BooleanField(
+        default=False,
+        verbose_name='Random sample',
+    )
+    stats_file = models.FileField(
+        storage=get_profile_storage,
+        verbose_name='pstats file',
+    )
+    stacks_file = models.FileField(
+        storage=get_profile_storage,
+        verbose_name='Collapsed stacks',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Created',
+    )
+
+    class Meta:
+        verbose_name = "Request profile"
+        verbose_name_plural = "Request profiles"
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.action} {self.method} {self.path};'
+
+
+class MediaBlob(models.Model):
+    """
+    Model for reference counts of content-addressed media files.
+    """
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='File name',
+    )
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='References',
+    )
+
+    class Meta:
+        verbose_name = "Media blob"
+        verbose_name_plural = "Media blobs"
+
+    def __str__(self):
+        return f'{self.name} ({self.refs});'
+
+
+class ImageUpload(models.Model):
+    """
+    Model for resumable image uploads sent in chunks.
+    """
+    token = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        verbose_name='Token',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='User',
+    )
+    filename = models.CharField(
+        max_length=255,
+        verbose_name='File name',
+    )
+    size = models.PositiveIntegerField(
+        verbose_name='Size',
+    )
+    offset = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Received bytes',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Created',
+    )
+
+    class Meta:
+        verbose_name = "Image upload"
+        verbose_name_plural = "Image uploads"
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.size});'
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_DIR, self.token.hex)
+
+    @property
+    def complete(self):
+        return self.offset == self.size
+
+
+class Job(models.Model):
+    """
+    Model for deferred task calls, see api.jobs. Finished jobs are
+    deleted, failed ones are kept for inspection.
+    """
+    task = models.CharField(
+        max_length=255,
+        verbose_name='Task',
+    )
+    args = models.JSONField(
+        default=list,
+        verbose_name='Arguments',
+    )
+    kwargs = models.JSONField(
+        default=dict,
+        verbose_name='Keyword arguments',
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Run at',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Attempts',
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Max attempts',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Created',
+    )
+    failed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Failed',
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Last error',
+    )
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        indexes = [
+            models.Index(
+                fields=['run_at'],
+                condition=models.Q(failed_at=None),
+                name='job_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk};'
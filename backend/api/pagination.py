@@ -1,6 +1,167 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import (
+    EmptyPage,
+    Page,
+    PageNotAnInteger,
+    Paginator
+)
+from django.db import connections
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from api.cache import api_cache
+
+
+class EstimatedPage(Page):
+    """
+    Page whose successor is known from one extra fetched row rather
+    than from the total count.
+    """
+
+    def __init__(self, object_list, number, paginator, more):
+        super().__init__(object_list, number, paginator)
+        self.more = more
+
+    def has_next(self):
+        return self.more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that does not run an exact COUNT(*) over large results.
+
+    On PostgreSQL, the count of an unfiltered queryset is taken from
+    ``pg_class.reltuples`` and that of a filtered one from the row
+    estimate of its EXPLAIN; results estimated above
+    PAGINATION_ESTIMATE_THRESHOLD rows report the estimate. On other
+    backends, exact counts above the threshold are cached for
+    PAGINATION_COUNT_TIMEOUT seconds. Smaller results are counted
+    exactly, as usual.
+    """
+
+    @cached_property
+    def counted(self):
+        """
+        Return (count, whether it is approximate).
+        """
+        queryset = self.object_list
+        threshold = settings.PAGINATION_ESTIMATE_THRESHOLD
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0, False
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = self.estimate(queryset, sql, params)
+            if estimate >= threshold:
+                return estimate, True
+            return queryset.count(), False
+        key = hashlib.md5(
+            f'{queryset.db}:{sql}:{params}'.encode()
+        ).hexdigest()
+        count = api_cache.get('counts', key)
+        if count is not None:
+            return count, True
+        count = queryset.count()
+        if count >= threshold:
+            api_cache.set(
+                'counts', key, count, settings.PAGINATION_COUNT_TIMEOUT
+            )
+        return count, False
+
+    @cached_property
+    def count(self):
+        return self.counted[0]
+
+    @property
+    def approximate(self):
+        return self.counted[1]
+
+    def estimate(self, queryset, sql, params):
+        query = queryset.query
+        unfiltered = (
+            not query.where and not query.distinct and not query.combinator
+        )
+        with connections[queryset.db].cursor() as cursor:
+            if unfiltered:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+                # Tables never analyzed report -1 or 0.
+                return int(row[0]) if row and row[0] > 0 else 0
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def validate_number(self, number):
+        if not self.approximate:
+            return super().validate_number(number)
+        # The estimate may fall short of the real count, so pages
+        # past it are allowed and checked when fetched.
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.approximate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(
+            self.object_list[bottom:bottom + self.per_page + 1]
+        )
+        more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if number > 1 and not object_list:
+            raise EmptyPage('That page contains no results')
+        if more:
+            self.count = max(self.count, bottom + len(object_list) + 1)
+        else:
+            # The last page gives the exact count.
+            self.count = bottom + len(object_list)
+        return EstimatedPage(object_list, number, self, more)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    Page number pagination with estimated counts for large results,
+    see EstimatedCountPaginator. Responses tell whether the count is
+    approximate in ``count_is_approximate``.
+    """
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_is_approximate', self.page.paginator.approximate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count_is_approximate'] = {
+            'type': 'boolean',
+        }
+        return schema
 
 
-class LimitPageNumberPagination(PageNumberPagination):
+class LimitPageNumberPagination(EstimatedCountPagination):
     page_size_query_param = 'limit'
     max_page_size = 10
@@ -0,0 +1,177 @@
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from api.cache import api_cache
+from api.similarity import fetch_pairs
+from recipes.models import RecipeIngredient
+
+# Recipes saved this long before the last catch-up are read again,
+# covering transactions that were still open at the time.
+CATCH_UP_MARGIN = timedelta(minutes=1)
+
+
+class PantryIndex:
+    """
+    In-process inverted index from ingredient id to the sorted array
+    of ids of the recipes using it, built on first use.
+
+    Changes in this process are applied right away; every change also
+    bumps the ``pantry`` cache namespace, and other workers then re-read
+    recipes saved since their last catch-up. Recipes deleted in other
+    workers stay in the index until the next full rebuild, which
+    happens every PANTRY_INDEX_MAX_AGE seconds, and are dropped when
+    results are loaded.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings = None
+        self.recipes = {}
+        self.sizes = np.zeros(0, dtype=np.int32)
+        self.version = None
+        self.built_at = 0
+        self.synced_at = None
+
+    def build(self):
+        version = api_cache.namespace_version('pantry')
+        synced_at = timezone.now()
+        pairs = fetch_pairs(
+            RecipeIngredient.objects.order_by('ingredient_id', 'recipe_id'),
+            'ingredient_id', 'recipe_id'
+        )
+        ingredients, starts = np.unique(pairs[:, 0], return_index=True)
+        recipe_ids = pairs[:, 1].astype(np.int32)
+        postings = dict(zip(
+            ingredients.tolist(), np.split(recipe_ids, starts[1:])
+        ))
+        sizes = np.bincount(recipe_ids).astype(np.int32)
+        recipes = {}
+        for ingredient_id, recipe_id in pairs.tolist():
+            recipes.setdefault(recipe_id, []).append(ingredient_id)
+        with self.lock:
+            self.postings = postings
+            self.recipes = recipes
+            self.sizes = sizes
+            self.version = version
+            self.synced_at = synced_at
+            self.built_at = time.monotonic()
+
+    def ensure_current(self):
+        if (
+            self.postings is None
+            or time.monotonic() - self.built_at
+            > settings.PANTRY_INDEX_MAX_AGE
+        ):
+            self.build()
+            return
+        version = api_cache.namespace_version('pantry')
+        if version == self.version:
+            return
+        synced_at = timezone.now()
+        changed = RecipeIngredient.objects.filter(
+            recipe__updated_at__gte=self.synced_at - CATCH_UP_MARGIN
+        )
+        recipe_ids = set(changed.values_list('recipe_id', flat=True))
+        self.apply(recipe_ids, fetch_pairs(
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids),
+            'recipe_id', 'ingredient_id'
+        ))
+        with self.lock:
+            self.version = version
+            self.synced_at = synced_at
+
+    def apply(self, recipe_ids, pairs):
+        """
+        Replace the ingredients of the given recipes with ``pairs``
+        of (recipe_id, ingredient_id); recipes without pairs are
+        removed.
+        """
+        ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in pairs.tolist():
+            ingredients[recipe_id].append(ingredient_id)
+        with self.lock:
+            for recipe_id, new in ingredients.items():
+                old = self.recipes.pop(recipe_id, [])
+                for ingredient_id in set(old) - set(new):
+                    posting = self.postings[ingredient_id]
+                    self.postings[ingredient_id] = np.delete(
+                        posting, np.searchsorted(posting, recipe_id)
+                    )
+                for ingredient_id in set(new) - set(old):
+                    posting = self.postings.get(
+                        ingredient_id, np.zeros(0, dtype=np.int32)
+                    )
+                    self.postings[ingredient_id] = np.insert(
+                        posting, np.searchsorted(posting, recipe_id),
+                        recipe_id
+                    )
+                if new:
+                    self.recipes[recipe_id] = new
+                if recipe_id >= len(self.sizes):
+                    self.sizes = np.concatenate([
+                        self.sizes,
+                        np.zeros(
+                            recipe_id + 1 - len(self.sizes), dtype=np.int32
+                        ),
+                    ])
+                self.sizes[recipe_id] = len(new)
+
+    def refresh_recipe(self, recipe_id):
+        """
+        Re-read one recipe after its ingredients changed.
+        """
+        if self.postings is not None:
+            self.apply({recipe_id}, fetch_pairs(
+                RecipeIngredient.objects.filter(recipe_id=recipe_id),
+                'recipe_id', 'ingredient_id'
+            ))
+        api_cache.invalidate('pantry')
+        with self.lock:
+            self.version = api_cache.namespace_version('pantry')
+
+    def search(self, ingredient_ids, limit, max_missing=None):
+        """
+        Return (recipe_ids, matched, total) arrays of the ``limit``
+        recipes covering the largest share of their ingredients with
+        ``ingredient_ids``; ties go to more matched ingredients, then
+        to newer recipes.
+        """
+        self.ensure_current()
+        with self.lock:
+            postings = [
+                self.postings[ingredient_id]
+                for ingredient_id in set(ingredient_ids)
+                if ingredient_id in self.postings
+            ]
+            sizes = self.sizes
+        empty = np.zeros(0, dtype=np.int32)
+        if not postings:
+            return empty, empty, empty
+        counts = np.bincount(np.concatenate(postings), minlength=len(sizes))
+        recipe_ids = np.flatnonzero(counts)
+        matched = counts[recipe_ids]
+        total = sizes[recipe_ids]
+        if max_missing is not None:
+            keep = total - matched <= max_missing
+            recipe_ids, matched, total = (
+                recipe_ids[keep], matched[keep], total[keep]
+            )
+        coverage = matched / total
+        if len(coverage) > limit:
+            # Only recipes tying with the limit-th coverage or above
+            # can make the top, sort just those.
+            floor = np.partition(coverage, -limit)[-limit]
+            keep = coverage >= floor
+            recipe_ids, matched, total, coverage = (
+                recipe_ids[keep], matched[keep], total[keep], coverage[keep]
+            )
+        order = np.lexsort((-recipe_ids, -matched, -coverage))[:limit]
+        return recipe_ids[order], matched[order], total[order]
+
+
+pantry_index = PantryIndex()
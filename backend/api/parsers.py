@@ -0,0 +1,28 @@
+import json
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """
+    Multipart parser for nested payloads: the ``data`` part holds the
+    JSON body and file parts are added to it by name, e.g. ``data``
+    with the recipe and ``image`` with the picture.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        if 'data' not in parsed.data:
+            return parsed
+        try:
+            data = json.loads(parsed.data['data'])
+        except ValueError as error:
+            raise ParseError(f'Multipart JSON parse error - {error}')
+        if not isinstance(data, dict):
+            raise ParseError('The data part must be a JSON object.')
+        # Request merges files with dict.update(), which would copy the
+        # value lists of the MultiValueDict, so files are merged here.
+        data.update(parsed.files.dict())
+        return DataAndFiles(data, MultiValueDict())
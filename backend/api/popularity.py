@@ -0,0 +1,103 @@
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from recipes.models import RecipeEvent, RecipeScore
+
+# Scores are kept relative to this moment, see refresh_scores().
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+ORDERINGS = ('popular', 'trending')
+KINDS = {
+    'favourite': RecipeEvent.FAVOURITE,
+    'cart': RecipeEvent.CART,
+    'redirect': RecipeEvent.REDIRECT,
+}
+
+
+def record_event(recipe_id, kind):
+    RecipeEvent.objects.create(recipe_id=recipe_id, kind=kind)
+
+
+def decay_rates():
+    """
+    Return {score field: decay rate per second}.
+    """
+    return {
+        field: math.log(2) / settings.RECIPE_SCORE_HALF_LIVES[field]
+        .total_seconds()
+        for field in ORDERINGS
+    }
+
+
+def event_terms(recipe_ids, kinds, times, rate):
+    """
+    Return the recipes and the logarithm of the summed weight of
+    their events, each event weight grown by exp(rate * age at EPOCH).
+    """
+    weights = np.zeros(max(KINDS.values()) + 1)
+    for name, weight in settings.RECIPE_SCORE_WEIGHTS.items():
+        weights[KINDS[name]] = weight
+    terms = np.log(weights[kinds]) + rate * times
+    order = np.argsort(recipe_ids, kind='stable')
+    recipe_ids, terms = recipe_ids[order], terms[order]
+    recipes, starts = np.unique(recipe_ids, return_index=True)
+    return recipes, np.logaddexp.reduceat(terms, starts)
+
+
+def refresh_scores(chunk_size=10000):
+    """
+    Fold up to ``chunk_size`` pending events into the recipe scores
+    and delete them. Return the number of events processed.
+
+    An event of weight w at time t contributes w * exp(-rate * (now - t))
+    to a score. Multiplying every score by exp(rate * (now - EPOCH))
+    does not change the ordering and makes the contribution
+    w * exp(rate * (t - EPOCH)), which no longer depends on now, so
+    stored scores never need rescaling. To stay within float range
+    the column holds the logarithm of one plus that sum: new events
+    are added with logaddexp and the ordering is still the same.
+    """
+    with transaction.atomic():
+        events = list(
+            RecipeEvent.objects.order_by('id').select_for_update()
+            .values_list('id', 'recipe_id', 'kind', 'created_at')
+            [:chunk_size]
+        )
+        if not events:
+            return 0
+        recipe_ids = np.array([event[1] for event in events])
+        kinds = np.array([event[2] for event in events])
+        times = np.array([
+            (event[3] - EPOCH).total_seconds() for event in events
+        ])
+        updates = {}
+        for field, rate in decay_rates().items():
+            recipes, terms = event_terms(recipe_ids, kinds, times, rate)
+            for recipe_id, term in zip(recipes.tolist(), terms.tolist()):
+                updates.setdefault(recipe_id, {})[field] = term
+        scores = RecipeScore.objects.select_for_update().in_bulk(
+            list(updates)
+        )
+        created = []
+        for recipe_id, terms in updates.items():
+            score = scores.get(recipe_id)
+            if score is None:
+                score = RecipeScore(recipe_id=recipe_id)
+                created.append(score)
+            for field, term in terms.items():
+                setattr(score, field, float(np.logaddexp(
+                    getattr(score, field), term
+                )))
+        RecipeScore.objects.bulk_update(
+            scores.values(), ORDERINGS, batch_size=1000
+        )
+        RecipeScore.objects.bulk_create(created)
+        # Not id__lte the last id: a transaction holding a lower id may
+        # commit after the read above.
+        RecipeEvent.objects.filter(
+            id__in=[event[0] for event in events]
+        ).delete()
+    return len(events)
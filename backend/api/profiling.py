@@ -0,0 +1,116 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from api.models import RequestProfile
+
+
+class StackSampler(threading.Thread):
+    """
+    Sample the stack of one thread every ``interval`` seconds and count
+    the stacks in the collapsed format used by flamegraph tools.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{os.path.basename(code.co_filename)}:{code.co_name}'
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        )
+
+
+class RequestProfiler:
+    """
+    Run cProfile and the stack sampler around a request.
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(
+            threading.get_ident(), settings.PROFILING_SAMPLE_INTERVAL
+        )
+        self.duration = 0
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        self.sampler.start()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        self.sampler.stop()
+        self.duration = time.perf_counter() - self.started_at
+
+    def save(self, request, action, sampled):
+        self.profiler.create_stats()
+        user = getattr(request, 'profiling_user', None)
+        profile = RequestProfile(
+            action=action,
+            method=request.method,
+            path=request.get_full_path()[:2048],
+            user=user,
+            duration=self.duration * 1000,
+            sampled=sampled
+        )
+        name = f'{action}/{time.strftime("%Y%m%d-%H%M%S")}'
+        profile.stats_file.save(
+            f'{name}.prof',
+            ContentFile(marshal.dumps(self.profiler.stats)),
+            save=False
+        )
+        profile.stacks_file.save(
+            f'{name}.collapsed',
+            ContentFile(self.sampler.collapsed().encode()),
+            save=False
+        )
+        profile.save()
+        prune_profiles()
+        return profile
+
+
+def prune_profiles():
+    stale = RequestProfile.objects.order_by('-id')[settings.PROFILING_KEEP:]
+    for profile in stale:
+        profile.delete()
+
+
+def format_stats(stats_path, limit=40):
+    """
+    Render the top functions by cumulative time.
+    """
+    stream = io.StringIO()
+    stats = pstats.Stats(stats_path, stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
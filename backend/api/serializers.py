@@ -1,7 +1,18 @@
+import os
+from urllib.parse import urlsplit
+
+from django.conf import settings
 from django.core.validators import MinValueValidator
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.urls import reverse
 from rest_framework import serializers
 
 from api.fields import Base64ImageField
+from api.fragments import get_fragments
+from api.models import ImageUpload
+from api.pantry import pantry_index
+from api.similarity import update_similar
 from recipes.models import (
     Favourite,
     Ingredient,
@@ -43,10 +54,33 @@ class UserSerializer(serializers.ModelSerializer):
             return Follow.objects.filter(user=user, following=obj).exists()
         return False
 
+    @transaction.atomic
     def create(self, validated_data):
         user = User.objects.create_user(**validated_data)
         return user
 
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        # The avatar is stored and referenced in one transaction.
+        return super().update(instance, validated_data)
+
+
+class AuthorSerializer(UserSerializer):
+    """
+    Viewer-independent part of UserSerializer used inside recipes.
+    """
+    is_subscribed = None
+
+    class Meta(UserSerializer.Meta):
+        fields = (
+            'email',
+            'id',
+            'username',
+            'first_name',
+            'last_name',
+            'avatar'
+        )
+
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -85,6 +119,70 @@ class SimpleRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class PantrySearchSerializer(serializers.Serializer):
+    """
+    Query parameters of the pantry search.
+    """
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=settings.PANTRY_MAX_INGREDIENTS
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.PANTRY_MAX_RESULTS,
+        default=settings.PANTRY_RESULTS
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """
+    One sub-request of a batch: an API path with its query string and,
+    for writes, a JSON body.
+    """
+    method = serializers.ChoiceField(choices=settings.BATCH_METHODS)
+    path = serializers.CharField(max_length=2048)
+    body = serializers.JSONField(required=False)
+
+    def validate_path(self, value):
+        path = urlsplit(value).path
+        if not path.startswith(reverse('api-root')):
+            raise serializers.ValidationError('Only API paths are allowed.')
+        if path == reverse('batch'):
+            raise serializers.ValidationError('Batches can not be nested.')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = serializers.ListField(
+        child=BatchItemSerializer(),
+        min_length=1,
+        max_length=settings.BATCH_MAX_REQUESTS
+    )
+
+
+class PantryRecipeSerializer(SimpleRecipeSerializer):
+    """
+    A recipe found by the pantry search with its coverage by the
+    given ingredients.
+    """
+    matched = serializers.IntegerField(read_only=True)
+    total = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(SimpleRecipeSerializer.Meta):
+        fields = SimpleRecipeSerializer.Meta.fields + (
+            'matched', 'total', 'coverage', 'missing_ingredients'
+        )
+
+    def get_missing_ingredients(self, recipe):
+        return IngredientSerializer(
+            recipe.missing_ingredients, many=True
+        ).data
+
+
 class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -102,9 +200,9 @@ class IngredientSerializer(serializers.ModelSerializer):
 class AddIngredientSerializer(serializers.ModelSerializer):
     """
     Serializer for the creation of Ingredient objects.
+    Ingredient ids are resolved in bulk by RecipeWriteSerializer.
     """
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         validators=[MinValueValidator(
             1,
@@ -144,37 +242,140 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeFragmentSerializer(serializers.ModelSerializer):
     """
-    Serializer for reading Recipe objects.
+    Viewer-independent part of a recipe, rendered once per recipe
+    version and cached. Image URLs are kept relative.
     """
-    author = UserSerializer()
+    author = AuthorSerializer()
     tags = TagSerializer(many=True)
     ingredients = RecipeIngredientSerializer(
         many=True,
         source='recipe_ingredients',
         read_only=True
     )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
-                  'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time')
 
-    def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if not user.is_anonymous:
-            return Favourite.objects.filter(recipe=obj, user=user).exists()
-        return False
 
-    def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if not user.is_anonymous:
-            return Shopping.objects.filter(recipe=obj, user=user).exists()
-        return False
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    Build recipe representations from cached fragments and overlay
+    the viewer's flags, fetched with one query each for the whole page.
+
+    With ``normalize_authors`` in the context, recipes carry only
+    ``author_id`` and each distinct author is rendered once into
+    ``authors``, keyed by id, for the view to add to the response.
+    """
+    authors = None
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        fragments = get_fragments(recipes, self.render_fragments)
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        favorited = in_shopping_cart = subscribed = set()
+        if user is not None and not user.is_anonymous:
+            recipe_ids = [recipe.pk for recipe in recipes]
+            favorited = set(Favourite.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            in_shopping_cart = set(Shopping.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            subscribed = set(Follow.objects.filter(
+                user=user,
+                following_id__in={recipe.author_id for recipe in recipes}
+            ).values_list('following_id', flat=True))
+        if self.context.get('normalize_authors'):
+            self.authors = {}
+            for fragment in fragments:
+                author = fragment['author']
+                if str(author['id']) not in self.authors:
+                    self.authors[str(author['id'])] = self.render_author(
+                        author, request, author['id'] in subscribed
+                    )
+        return [
+            self.overlay(
+                fragment,
+                request,
+                is_favorited=fragment['id'] in favorited,
+                is_in_shopping_cart=fragment['id'] in in_shopping_cart,
+                is_subscribed=fragment['author']['id'] in subscribed
+            )
+            for fragment in fragments
+        ]
+
+    def render_fragments(self, recipes):
+        prefetch_related_objects(
+            recipes, 'author', 'tags', 'recipe_ingredients__ingredient'
+        )
+        serializer = RecipeFragmentSerializer()
+        return [serializer.to_representation(recipe) for recipe in recipes]
+
+    def overlay(self, fragment, request, is_favorited, is_in_shopping_cart,
+                is_subscribed):
+        representation = {
+            'id': fragment['id'],
+            'tags': fragment['tags'],
+        }
+        if self.authors is not None:
+            representation['author_id'] = fragment['author']['id']
+        else:
+            representation['author'] = self.render_author(
+                fragment['author'], request, is_subscribed
+            )
+        representation.update({
+            'ingredients': fragment['ingredients'],
+            'is_favorited': is_favorited,
+            'is_in_shopping_cart': is_in_shopping_cart,
+            'name': fragment['name'],
+            'image': self.absolute_url(request, fragment['image']),
+            'text': fragment['text'],
+            'cooking_time': fragment['cooking_time'],
+        })
+        return representation
+
+    def render_author(self, author, request, is_subscribed):
+        return {
+            'email': author['email'],
+            'id': author['id'],
+            'username': author['username'],
+            'first_name': author['first_name'],
+            'last_name': author['last_name'],
+            'is_subscribed': is_subscribed,
+            'avatar': self.absolute_url(request, author['avatar']),
+        }
+
+    def absolute_url(self, request, url):
+        if url and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class RecipeReadSerializer(RecipeFragmentSerializer):
+    """
+    Serializer for reading Recipe objects.
+    """
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'tags', 'author', 'ingredients',
+                  'is_favorited', 'is_in_shopping_cart',
+                  'name', 'image', 'text', 'cooking_time')
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        list_serializer = RecipeListSerializer(
+            child=RecipeFragmentSerializer(),
+            context=self.context
+        )
+        return list_serializer.to_representation([instance])[0]
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -182,10 +383,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     Serializer for writing, updating, and deleting Recipe objects
     """
     ingredients = AddIngredientSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField(required=True, allow_null=True)
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
@@ -230,6 +428,9 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'Ingredient amount must be at least 1.'
                 )
+        ingredients = self.resolve_ids(Ingredient, seen_ingredients)
+        for ingredient in value:
+            ingredient['id'] = ingredients[ingredient['id']]
         return value
 
     def validate_tags(self, value):
@@ -243,7 +444,20 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                     f'Duplicate tag with ID {tag_id} found.'
                 )
             seen_tags.add(tag_id)
-        return value
+        tags = self.resolve_ids(Tag, seen_tags)
+        return [tags[tag_id] for tag_id in value]
+
+    def resolve_ids(self, model, ids):
+        """
+        Fetch all referenced objects with a single IN query.
+        """
+        objects = model.objects.in_bulk(ids)
+        missing = sorted(set(ids) - set(objects))
+        if missing:
+            raise serializers.ValidationError(
+                f'Invalid pk "{missing[0]}" - object does not exist.'
+            )
+        return objects
 
     def validate_image(self, value):
         if not value:
@@ -257,35 +471,90 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             )
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = super().create(validated_data)
-        self.add_tags_ingredients(ingredients, tags, recipe)
+        self.add_tags_ingredients(ingredients, tags, recipe, created=True)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        instance.ingredients.clear()
+        instance = super().update(instance, validated_data)
         self.add_tags_ingredients(ingredients, tags, instance)
-        return super().update(instance, validated_data)
-
-    def add_tags_ingredients(self, ingredients, tags, recipe):
-        RecipeIngredient.objects.filter(recipe=recipe).delete()
-        recipe_ingredients = [
-            RecipeIngredient(
-                recipe=recipe,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount']
-            )
-            for ingredient in ingredients
-        ]
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
-        if tags is not None:
+        return instance
+
+    def add_tags_ingredients(self, ingredients, tags, recipe, created=False):
+        """
+        Write only the difference between the stored and the submitted
+        ingredients and tags, and keep the saved rows so the response is
+        rendered without querying them again.
+        """
+        existing = {}
+        if not created:
+            existing = {
+                recipe_ingredient.ingredient_id: recipe_ingredient
+                for recipe_ingredient in recipe.recipe_ingredients.all()
+            }
+        recipe_ingredients = []
+        to_create = []
+        to_update = []
+        for ingredient in ingredients:
+            recipe_ingredient = existing.pop(ingredient['id'].id, None)
+            if recipe_ingredient is None:
+                recipe_ingredient = RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient['id'],
+                    amount=ingredient['amount']
+                )
+                to_create.append(recipe_ingredient)
+            else:
+                recipe_ingredient.ingredient = ingredient['id']
+                if recipe_ingredient.amount != ingredient['amount']:
+                    recipe_ingredient.amount = ingredient['amount']
+                    to_update.append(recipe_ingredient)
+            recipe_ingredients.append(recipe_ingredient)
+        if existing:
+            RecipeIngredient.objects.filter(
+                pk__in=[item.pk for item in existing.values()]
+            ).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        if created:
+            recipe.tags.add(*tags)
+        else:
             recipe.tags.set(tags)
+        self._saved_related = {
+            'recipe_ingredients': recipe_ingredients,
+            'tags': tags,
+        }
+        update_similar.delay(recipe.pk)
+        # bulk_create() sends no signals to keep the pantry index current.
+        transaction.on_commit(lambda: pantry_index.refresh_recipe(recipe.pk))
+
+    def prime_prefetch_cache(self, recipe, name, objects):
+        """
+        Store objects the way prefetch_related() does, so that
+        ``getattr(recipe, name).all()`` no longer hits the database.
+        """
+        queryset = getattr(recipe, name).all()
+        queryset._result_cache = list(objects)
+        queryset._prefetch_done = True
+        if not hasattr(recipe, '_prefetched_objects_cache'):
+            recipe._prefetched_objects_cache = {}
+        recipe._prefetched_objects_cache[name] = queryset
 
     def to_representation(self, instance):
+        # UpdateModelMixin drops the prefetch cache after saving,
+        # so it is primed here rather than in add_tags_ingredients().
+        saved_related = getattr(self, '_saved_related', {})
+        for name, objects in saved_related.items():
+            self.prime_prefetch_cache(instance, name, objects)
         context = self.context
         return RecipeReadSerializer(instance, context=context).data
 
@@ -403,3 +672,30 @@ class ShoppingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Shopping
         fields = '__all__'
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """
+    Serializer for starting and resuming chunked image uploads.
+    """
+
+    class Meta:
+        model = ImageUpload
+        fields = ('token', 'filename', 'size', 'offset')
+        read_only_fields = ('token', 'offset')
+
+    def validate_filename(self, value):
+        extension = os.path.splitext(value)[1].lower()
+        if extension not in settings.UPLOAD_EXTENSIONS:
+            raise serializers.ValidationError(
+                'Allowed extensions: '
+                f'{", ".join(settings.UPLOAD_EXTENSIONS)}.'
+            )
+        return os.path.basename(value)
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Size must be between 1 and {settings.UPLOAD_MAX_SIZE}.'
+            )
+        return value
@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from api.cache import api_cache
+from api.events import publish_recipe
+from api.models import RequestProfile
+from api.pantry import pantry_index
+from api.storage import acquire, release
+from recipes.models import Recipe, RecipeIngredient, RecipeScore, Tag
+from users.models import User
+
+# Content-addressed file fields whose references are counted.
+MEDIA_FIELDS = {
+    Recipe: 'image',
+    User: 'avatar',
+}
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    api_cache.invalidate('tags')
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_score(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        RecipeScore.objects.create(recipe=instance)
+
+
+@receiver(post_save, sender=Recipe)
+def announce_recipe(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        publish_recipe(instance)
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def refresh_pantry_index(sender, instance, **kwargs):
+    recipe_id = instance.recipe_id
+    transaction.on_commit(lambda: pantry_index.refresh_recipe(recipe_id))
+
+
+@receiver(post_delete, sender=RequestProfile)
+def delete_profile_files(sender, instance, **kwargs):
+    instance.stats_file.delete(save=False)
+    instance.stacks_file.delete(save=False)
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_media(sender, instance, update_fields, **kwargs):
+    field = MEDIA_FIELDS[sender]
+    if instance.pk is None or (
+        update_fields is not None and field not in update_fields
+    ):
+        instance._previous_media = None
+        return
+    instance._previous_media = sender.objects.filter(
+        pk=instance.pk
+    ).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def count_media_references(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and MEDIA_FIELDS[sender] not in update_fields:
+        return
+    previous = getattr(instance, '_previous_media', None)
+    current = getattr(instance, MEDIA_FIELDS[sender]).name
+    if previous != current:
+        acquire(current)
+        release(previous)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_media(sender, instance, **kwargs):
+    release(getattr(instance, MEDIA_FIELDS[sender]).name)
@@ -0,0 +1,256 @@
+import itertools
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from scipy import sparse
+
+from api.jobs import task
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+# Candidates scored exactly per neighbour when updating one recipe.
+CANDIDATES_PER_NEIGHBOUR = 5
+# Size of the dense similarity block, 64 MiB of float32.
+BLOCK_CELLS = 2 ** 24
+
+
+def fetch_pairs(queryset, *fields):
+    """
+    Read two integer columns into an (n, 2) array without building
+    a Python tuple per row.
+    """
+    values = itertools.chain.from_iterable(
+        queryset.values_list(*fields).iterator(chunk_size=10000)
+    )
+    return np.fromiter(values, dtype=np.int64).reshape(-1, 2)
+
+
+def build_matrix(recipe_ids, ingredient_pairs, tag_pairs, tag_weight):
+    """
+    Build the binary recipe × feature matrix, features being the
+    ingredients followed by the tags, and the feature weights.
+    """
+    ingredients, ingredient_columns = np.unique(
+        ingredient_pairs[:, 1], return_inverse=True
+    )
+    tags, tag_columns = np.unique(tag_pairs[:, 1], return_inverse=True)
+    rows = np.searchsorted(
+        recipe_ids, np.concatenate([ingredient_pairs[:, 0], tag_pairs[:, 0]])
+    )
+    columns = np.concatenate([
+        ingredient_columns.ravel(), tag_columns.ravel() + len(ingredients)
+    ])
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(len(recipe_ids), len(ingredients) + len(tags))
+    )
+    weights = np.concatenate([
+        np.ones(len(ingredients), dtype=np.float32),
+        np.full(len(tags), tag_weight, dtype=np.float32),
+    ])
+    return matrix, weights
+
+
+def similarity(shared, first_size, second_size, metric):
+    """
+    Weighted cosine or Jaccard similarity of two feature sets from the
+    weight of their intersection and of each set. Works on arrays too.
+    """
+    if metric == 'jaccard':
+        return shared / (first_size + second_size - shared)
+    return shared / np.sqrt(first_size * second_size)
+
+
+def neighbours(matrix, weights, k, metric, block_cells=BLOCK_CELLS):
+    """
+    Yield (rows, columns, scores) arrays with the top ``k`` neighbours
+    of every row. Rows are scored in blocks: a sparse product gives
+    the shared feature weight of the block against all recipes as a
+    dense array of about ``block_cells`` floats, then the top ``k`` of
+    each row is selected with argpartition.
+    """
+    count = matrix.shape[0]
+    k = min(k, count - 1)
+    if k < 1:
+        return
+    sizes = matrix @ weights
+    weighted = matrix.multiply(weights).tocsr()
+    transposed = matrix.T.tocsr()
+    block_size = max(1, block_cells // count)
+    for start in range(0, count, block_size):
+        stop = min(start + block_size, count)
+        scores = (weighted[start:stop] @ transposed).toarray()
+        block_sizes = sizes[start:stop, np.newaxis]
+        if metric == 'jaccard':
+            denominator = block_sizes + sizes - scores
+        else:
+            denominator = np.sqrt(block_sizes * sizes)
+        np.divide(scores, denominator, out=scores, where=denominator > 0)
+        block_rows = np.arange(stop - start)
+        scores[block_rows, block_rows + start] = 0
+        columns = np.argpartition(scores, -k, axis=1)[:, -k:]
+        top = np.take_along_axis(scores, columns, axis=1)
+        order = np.argsort(-top, axis=1, kind='stable')
+        columns = np.take_along_axis(columns, order, axis=1).ravel()
+        top = np.take_along_axis(top, order, axis=1).ravel()
+        rows = np.repeat(block_rows + start, k)
+        keep = top > 0
+        yield rows[keep], columns[keep], top[keep]
+
+
+def load_matrix():
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('id').values_list('id', flat=True)
+        .iterator(chunk_size=10000),
+        dtype=np.int64
+    )
+    matrix, weights = build_matrix(
+        recipe_ids,
+        fetch_pairs(RecipeIngredient.objects.all(), 'recipe_id',
+                    'ingredient_id'),
+        fetch_pairs(Recipe.tags.through.objects.all(), 'recipe_id',
+                    'tag_id'),
+        settings.SIMILAR_RECIPES_TAG_WEIGHT
+    )
+    return recipe_ids, matrix, weights
+
+
+def build_similar(block_cells=BLOCK_CELLS, batch_size=5000):
+    """
+    Recompute the neighbours of every recipe and replace the table
+    in one transaction. Return the number of stored rows.
+    """
+    recipe_ids, matrix, weights = load_matrix()
+    stored = 0
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        for rows, columns, scores in neighbours(
+            matrix,
+            weights,
+            settings.SIMILAR_RECIPES_COUNT,
+            settings.SIMILAR_RECIPES_METRIC,
+            block_cells
+        ):
+            SimilarRecipe.objects.bulk_create([
+                SimilarRecipe(recipe_id=recipe, similar_id=similar,
+                              score=score)
+                for recipe, similar, score in zip(
+                    recipe_ids[rows].tolist(),
+                    recipe_ids[columns].tolist(),
+                    scores.tolist()
+                )
+            ], batch_size=batch_size)
+            stored += len(rows)
+    return stored
+
+
+def feature_weights(recipe_ids):
+    """
+    Return {recipe_id: total feature weight} for the given recipes.
+    """
+    tag_weight = settings.SIMILAR_RECIPES_TAG_WEIGHT
+    sizes = Counter(dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values('recipe_id').annotate(count=Count('id'))
+        .values_list('recipe_id', 'count')
+    ))
+    for recipe_id, count in (
+        Recipe.tags.through.objects.filter(recipe_id__in=recipe_ids)
+        .values('recipe_id').annotate(count=Count('id'))
+        .values_list('recipe_id', 'count')
+    ):
+        sizes[recipe_id] += tag_weight * count
+    return sizes
+
+
+@task
+def update_similar(recipe_id):
+    """
+    Refresh the neighbours of one changed recipe and insert it into
+    the lists of recipes it now beats. Only the recipes sharing the
+    most features are scored, the nightly build_similar_recipes run
+    makes the table exact again.
+    """
+    if not Recipe.objects.filter(pk=recipe_id).exists():
+        return
+    k = settings.SIMILAR_RECIPES_COUNT
+    metric = settings.SIMILAR_RECIPES_METRIC
+    ingredients = RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values('ingredient_id')
+    tags = Recipe.tags.through.objects.filter(
+        recipe_id=recipe_id
+    ).values('tag_id')
+    shared = Counter(dict(
+        RecipeIngredient.objects.filter(ingredient_id__in=ingredients)
+        .exclude(recipe_id=recipe_id)
+        .values('recipe_id').annotate(count=Count('id'))
+        .values_list('recipe_id', 'count')
+    ))
+    for candidate, count in (
+        Recipe.tags.through.objects.filter(tag_id__in=tags)
+        .exclude(recipe_id=recipe_id)
+        .values('recipe_id').annotate(count=Count('id'))
+        .values_list('recipe_id', 'count')
+    ):
+        shared[candidate] += settings.SIMILAR_RECIPES_TAG_WEIGHT * count
+    candidates = [
+        candidate for candidate, _ in
+        shared.most_common(k * CANDIDATES_PER_NEIGHBOUR)
+    ]
+    sizes = feature_weights(candidates + [recipe_id])
+    scores = {
+        candidate: float(similarity(
+            shared[candidate], sizes[recipe_id], sizes[candidate], metric
+        ))
+        for candidate in candidates
+    }
+    top = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        SimilarRecipe.objects.filter(similar_id=recipe_id).delete()
+        floors = {
+            candidate: (count, floor)
+            for candidate, count, floor in
+            SimilarRecipe.objects.filter(recipe_id__in=candidates)
+            .values('recipe_id')
+            .annotate(count=Count('id'), floor=Min('score'))
+            .values_list('recipe_id', 'count', 'floor')
+        }
+        rows = [
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar,
+                          score=score)
+            for similar, score in top
+        ]
+        overfull = []
+        for candidate, score in scores.items():
+            count, floor = floors.get(candidate, (0, 0))
+            if count < k or score > floor:
+                rows.append(SimilarRecipe(
+                    recipe_id=candidate, similar_id=recipe_id, score=score
+                ))
+                if count >= k:
+                    overfull.append(candidate)
+        SimilarRecipe.objects.bulk_create(rows)
+        trim_neighbours(overfull, k)
+
+
+def trim_neighbours(recipe_ids, k):
+    """
+    Drop the weakest neighbours of recipes holding more than ``k``.
+    """
+    if not recipe_ids:
+        return
+    kept = Counter()
+    excess = []
+    for pk, recipe_id in (
+        SimilarRecipe.objects.filter(recipe_id__in=recipe_ids)
+        .order_by('recipe_id', '-score', 'similar_id')
+        .values_list('pk', 'recipe_id')
+    ):
+        kept[recipe_id] += 1
+        if kept[recipe_id] > k:
+            excess.append(pk)
+    SimilarRecipe.objects.filter(pk__in=excess).delete()
@@ -0,0 +1,57 @@
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from api.sql import fingerprint
+
+logger = logging.getLogger('api.slow_queries')
+
+
+def is_execute_wrapper(code):
+    return code.co_varnames[1:3] == ('execute', 'sql')
+
+
+def project_frame(frame):
+    """
+    Return ``path:function`` of the innermost frame in project code,
+    e.g. ``api/serializers.py:get_is_favorited``, skipping execute
+    wrappers.
+    """
+    root = str(settings.BASE_DIR) + os.sep
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(root)
+            and 'site-packages' not in filename
+            and not is_execute_wrapper(frame.f_code)
+        ):
+            path = os.path.relpath(filename, root).replace(os.sep, '/')
+            return f'{path}:{frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class SlowQueryLogger:
+    """
+    Log queries slower than ``threshold`` seconds of a request as one
+    JSON object per line. Fed by the execute wrapper of
+    api.middleware.QueryTimer.
+    """
+
+    def __init__(self, request, threshold):
+        self.request = request
+        self.threshold = threshold
+
+    def log(self, sql, duration, context):
+        logger.warning(json.dumps({
+            'time': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': round(duration * 1000, 3),
+            'database': context['connection'].alias,
+            'action': getattr(self.request, 'view_action', 'unmatched'),
+            'frame': project_frame(sys._getframe(1)),
+            'fingerprint': fingerprint(sql),
+        }, ensure_ascii=False))
@@ -0,0 +1,42 @@
+import re
+
+from django.db import connections, router
+from django.db.models.sql import InsertQuery
+
+PLACEHOLDER = re.compile(r'%s')
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Normalize an SQL statement so that queries differing only
+    in literal values compare equal. Accepts both interpolated SQL
+    and SQL with %s placeholders.
+    """
+    sql = PLACEHOLDER.sub('?', sql)
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = VALUE_LIST.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def insert_ignore(model, **values):
+    """
+    Insert a single row with INSERT ... ON CONFLICT DO NOTHING
+    (INSERT OR IGNORE on SQLite). Return True if a row was inserted,
+    False if it already existed.
+    """
+    using = router.db_for_write(model)
+    fields = [
+        field for field in model._meta.local_concrete_fields
+        if not field.primary_key
+    ]
+    query = InsertQuery(model, ignore_conflicts=True)
+    query.insert_values(fields, [model(**values)])
+    with connections[using].cursor() as cursor:
+        for sql, params in query.get_compiler(using=using).as_sql():
+            cursor.execute(sql, params)
+        return cursor.rowcount > 0
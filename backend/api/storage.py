@@ -0,0 +1,92 @@
+import hashlib
+import os
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import F
+
+from api.models import MediaBlob
+from api.sql import insert_ignore
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Name files by the SHA-256 of their content, e.g.
+    ``recipes/3f/3f2a…c1.png``, and store identical uploads once.
+    A name never changes content, so media can be cached forever.
+
+    Files are shared, so ``delete()`` leaves tracked files alone: they
+    are removed by ``release()`` once no model references them. Save
+    inside the transaction that calls ``acquire()``, so the file cannot
+    be removed before it is referenced.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        with transaction.atomic():
+            # Claim the name before looking at the file: delete_orphan()
+            # leaves claimed names alone and release() waits for the lock.
+            insert_ignore(MediaBlob, name=name, refs=0)
+            MediaBlob.objects.select_for_update().filter(name=name).first()
+            if self.exists(name):
+                return name
+            return super().save(name, content, max_length)
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], digest + extension
+        ).replace(os.sep, '/')
+
+    def delete(self, name):
+        if not MediaBlob.objects.filter(name=name).exists():
+            super().delete(name)
+
+
+def acquire(name):
+    """
+    Count one more reference to a stored file.
+    """
+    if not name:
+        return
+    insert_ignore(MediaBlob, name=name, refs=0)
+    MediaBlob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+@transaction.atomic
+def release(name):
+    """
+    Drop a reference to a stored file and delete the file after
+    commit if it was the last one.
+    """
+    if not name:
+        return
+    blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+    if blob is not None and blob.refs > 1:
+        MediaBlob.objects.filter(pk=blob.pk).update(refs=F('refs') - 1)
+        return
+    if blob is not None:
+        blob.delete()
+    transaction.on_commit(lambda: delete_orphan(name))
+
+
+@transaction.atomic
+def delete_orphan(name):
+    """
+    Delete a file unless the same content was saved again meanwhile.
+    Claiming the name waits for a save that holds it and makes later
+    saves wait until the file is gone, so they write it anew.
+    """
+    if insert_ignore(MediaBlob, name=name, refs=0):
+        # Saves of the name still wait for this transaction to end.
+        MediaBlob.objects.filter(name=name).delete()
+        default_storage.delete(name)
@@ -0,0 +1,149 @@
+import math
+import threading
+
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from rest_framework.throttling import SimpleRateThrottle
+
+from api import metrics
+
+LOCK_STRIPES = 64
+key_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket: a rate of 'N/period' allows bursts of N requests and
+    refills one token every period / N seconds.
+
+    The bucket is kept in the 'throttle' cache as a single number, the
+    time at which it will be full again (GCRA), so a check is one get
+    and one set whatever the rate. Threads of a worker are serialized by
+    striped locks; concurrent workers may let a few extra requests
+    through, as with the other DRF throttles.
+    """
+    cache = ConnectionProxy(caches, 'throttle')
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+    retry_after = None
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        interval = self.duration / self.num_requests
+        with key_locks[hash(self.key) % LOCK_STRIPES]:
+            self.now = self.timer()
+            full_at = max(self.cache.get(self.key, 0), self.now)
+            # Time until the bucket is full again with this request taken.
+            debt = full_at + interval - self.now
+            if debt > self.duration:
+                self.retry_after = debt - self.duration
+                request.throttled = True
+                metrics.throttled_requests_total.inc(
+                    scope=self.scope,
+                    action=getattr(request, 'view_action', 'unmatched')
+                )
+                return False
+            self.cache.set(self.key, self.now + debt, math.ceil(debt))
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Requests of an anonymous client, by IP address.
+    """
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request)
+        }
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Requests of an authenticated user.
+    """
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': request.user.pk
+        }
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Expensive actions, each with its own bucket per client. Views map
+    actions to scopes in ``throttle_scopes``, e.g.
+    ``{'create': 'recipe_write'}``. Requests already rejected by an
+    earlier throttle take no token.
+    """
+
+    def __init__(self):
+        # The scope, and so the rate, is known once the view calls.
+        self.rate = None
+
+    def allow_request(self, request, view):
+        if getattr(request, 'throttled', False):
+            return True
+        scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None)
+        )
+        if scope is None:
+            return True
+        self.scope = self.scope_for(scope)
+        self.rate = self.get_scope_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def scope_for(self, scope):
+        return scope
+
+    def get_scope_rate(self):
+        return self.get_rate()
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': ident
+        }
+
+
+class GlobalScopedTokenBucketThrottle(ScopedTokenBucketThrottle):
+    """
+    Expensive actions, with one bucket shared by all clients for the
+    scopes that have a ``<scope>_global`` rate, so that many clients
+    together can not overload them either. Must come last: requests
+    already rejected by a client's own bucket take no global token,
+    so one client can not use up the bucket of everyone.
+    """
+
+    def scope_for(self, scope):
+        return f'{scope}_global'
+
+    def get_scope_rate(self):
+        return self.THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': 'all'
+        }
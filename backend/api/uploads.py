@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from api.models import ImageUpload
+
+CHUNK_SIZE = 64 * 1024
+
+
+class OffsetConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Upload offset does not match.'
+    default_code = 'conflict'
+
+
+class ResumableUploadFile(UploadedFile):
+    """
+    A finished upload. ``temporary_file_path`` lets the storage move
+    the file into place instead of copying it. The file is only open
+    while its chunks are read, so no handle outlives the request.
+    """
+
+    def __init__(self, upload):
+        super().__init__(None, name=upload.filename, size=upload.size)
+        self.path = upload.path
+
+    def temporary_file_path(self):
+        return self.path
+
+    def chunks(self, chunk_size=None):
+        with open(self.path, 'rb') as file:
+            yield from File(file).chunks(chunk_size)
+
+
+def append_chunk(upload, stream, offset, length):
+    """
+    Write ``length`` bytes of ``stream`` at ``offset`` and return the
+    new offset. Chunks must arrive in order, so a client that lost a
+    response asks for the offset and resends from there.
+
+    The chunk is read from the client into a temporary file with no
+    transaction open. The offset is then advanced by compare-and-set,
+    and only the request that advanced it copies its chunk in place,
+    while its update holds the row for that short local copy.
+    """
+    if offset != upload.offset:
+        raise OffsetConflict(f'Expected offset {upload.offset}.')
+    if offset + length > upload.size:
+        raise serializers.ValidationError(
+            {'size': f'The upload is {upload.size} bytes long.'}
+        )
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    with tempfile.TemporaryFile(dir=settings.UPLOAD_DIR) as chunk_file:
+        received = 0
+        while received < length:
+            chunk = stream.read(min(CHUNK_SIZE, length - received))
+            if not chunk:
+                break
+            chunk_file.write(chunk)
+            received += len(chunk)
+        chunk_file.seek(0)
+        with transaction.atomic():
+            advanced = ImageUpload.objects.filter(
+                pk=upload.pk, offset=offset
+            ).update(offset=offset + received)
+            if not advanced:
+                current = ImageUpload.objects.filter(
+                    pk=upload.pk
+                ).values_list('offset', flat=True).first()
+                raise OffsetConflict(f'Expected offset {current}.')
+            with open(upload.path, 'ab') as file:
+                file.truncate(offset)
+                shutil.copyfileobj(chunk_file, file, CHUNK_SIZE)
+    upload.offset = offset + received
+    return upload.offset
+
+
+def open_upload(token, user):
+    """
+    Return the finished upload with this token as a file.
+    """
+    try:
+        token = uuid.UUID(token)
+    except ValueError:
+        raise serializers.ValidationError('Upload not found.')
+    upload = ImageUpload.objects.filter(token=token, user=user).first()
+    if upload is None or not os.path.exists(upload.path):
+        raise serializers.ValidationError('Upload not found.')
+    if not upload.complete:
+        raise serializers.ValidationError(
+            f'Upload is incomplete: {upload.offset} of {upload.size} bytes.'
+        )
+    return ResumableUploadFile(upload)
+
+
+def delete_upload(upload):
+    upload.delete()
+    if os.path.exists(upload.path):
+        os.remove(upload.path)
+
+
+def prune_uploads():
+    """
+    Drop uploads older than UPLOAD_EXPIRE_HOURS, used or not.
+    """
+    expired = ImageUpload.objects.filter(
+        created_at__lt=timezone.now() - timedelta(
+            hours=settings.UPLOAD_EXPIRE_HOURS
+        )
+    )
+    for upload in expired:
+        delete_upload(upload)
@@ -4,6 +4,8 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from api.views import (
+    BatchView,
+    ImageUploadViewSet,
     IngredientViewSet,
     RecipeRedirectView,
     RecipeViewSet,
@@ -18,6 +20,7 @@ router_v1.register('users', UserViewSet, basename='users')
 router_v1.register('tags', TagViewSet, basename='tags')
 router_v1.register('recipes', RecipeViewSet, basename='recipes')
 router_v1.register('ingredients', IngredientViewSet, basename='ingredients')
+router_v1.register('uploads', ImageUploadViewSet, basename='uploads')
 
 urlpatterns = [
     path(
@@ -25,6 +28,7 @@ urlpatterns = [
         RecipeRedirectView.as_view(),
         name='recipe-redirect'
     ),
+    path('batch/', BatchView.as_view(), name='batch'),
     path('', include(router_v1.urls)),
     path('auth/token/login/', LoginView.as_view(), name='login'),
     path('auth/token/logout/', LogoutView.as_view(), name='logout'),
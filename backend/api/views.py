@@ -1,24 +1,44 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth import update_session_auth_hash
-from django.db.models import Sum
-from django.http import HttpResponse, HttpResponseRedirect
+from django.db.models import Exists, OuterRef, Sum
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 from django.shortcuts import get_object_or_404, redirect
 from django_filters import rest_framework as filters
-from rest_framework import status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import FormParser, JSONParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.batch import run_batch
+from api.cache import api_cache
+from api.metrics import registry
+from api.filters import TAGS_CACHE_TIMEOUT, IngredientFilter, RecipeFilter
 from api.mixins import AddRemoveMixin
+from api.models import ImageUpload
 from api.pagination import LimitPageNumberPagination
+from api.pantry import pantry_index
+from api.popularity import record_event
+from api.parsers import MultiPartJSONParser
 from api.permissions import IsAuthorOrStaffOrReadOnly
+from api.sql import insert_ignore
+from api.uploads import append_chunk, delete_upload, prune_uploads
 from api.serializers import (
+    BatchSerializer,
     FavouriteSerializer,
     FollowSerializer,
+    ImageUploadSerializer,
     IngredientSerializer,
+    PantryRecipeSerializer,
+    PantrySearchSerializer,
     RecipeLinkSerializer,
     RecipeReadSerializer,
     RecipeWriteSerializer,
@@ -32,6 +52,7 @@ from recipes.models import (
     Favourite,
     Ingredient,
     Recipe,
+    RecipeEvent,
     RecipeIngredient,
     RecipeLink,
     Shopping,
@@ -96,35 +117,33 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post', 'delete'], url_path='subscribe')
     def subscribe(self, request, pk=None):
-        following_user = get_object_or_404(User, pk=pk)
         user = request.user
         if request.method == 'POST':
+            following_user = get_object_or_404(User, pk=pk)
             if user == following_user:
                 return Response(
                     {"detail": "You cannot follow yourself."},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            if Follow.objects.filter(
-                user=user,
-                following=following_user
-            ).exists():
+            if not insert_ignore(Follow, user=user, following=following_user):
                 return Response(
                     {"detail": "You are already following this user."},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            follow = Follow.objects.create(user=user, following=following_user)
             serializer = FollowSerializer(
-                follow,
+                Follow(user=user, following=following_user),
                 context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        follow = Follow.objects.filter(
+        if not pk.isdigit():
+            raise Http404
+        deleted, _ = Follow.objects.filter(
             user=user,
-            following=following_user
-        ).first()
-        if follow:
-            follow.delete()
+            following_id=pk
+        ).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(User, pk=pk)
         return Response(
             {"detail": "You are not following this user."},
             status=status.HTTP_400_BAD_REQUEST
@@ -171,6 +190,15 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     permission_classes = [AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        tags = api_cache.get_or_set(
+            'tags',
+            'list',
+            lambda: self.get_serializer(self.get_queryset(), many=True).data,
+            TAGS_CACHE_TIMEOUT
+        )
+        return Response(tags)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
@@ -181,10 +209,19 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class RecipeViewSet(viewsets.ModelViewSet, AddRemoveMixin):
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.defer('search_vector')
+    parser_classes = (JSONParser, MultiPartJSONParser, FormParser)
     pagination_class = LimitPageNumberPagination
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    # See api.throttling.ScopedTokenBucketThrottle.
+    throttle_scopes = {
+        'create': 'recipe_write',
+        'update': 'recipe_write',
+        'partial_update': 'recipe_write',
+        'download_shopping_cart': 'shopping_cart',
+        'get_short_link': 'short_link',
+    }
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve', 'get_short_link']:
@@ -205,6 +242,139 @@ class RecipeViewSet(viewsets.ModelViewSet, AddRemoveMixin):
             return RecipeWriteSerializer
         return RecipeReadSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['normalize_authors'] = (
+            self.action == 'list'
+            and self.request.query_params.get('normalize') == 'authors'
+        )
+        return context
+
+    def list(self, request, *args, **kwargs):
+        """
+        With ``?normalize=authors``, recipes reference ``author_id`` and
+        the distinct authors of the page are listed once in ``authors``.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(
+            self.paginate_queryset(queryset), many=True
+        )
+        response = self.get_paginated_response(serializer.data)
+        if serializer.authors is not None:
+            response.data['authors'] = serializer.authors
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Answer conditional requests with 304 after a single-row lookup
+        of ``updated_at`` and the viewer's flags.
+        """
+        etag, last_modified = self.get_recipe_validators(request)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            # The per-user flags have no timestamp, so authenticated
+            # clients can only revalidate with the ETag.
+            last_modified=(
+                last_modified if request.user.is_anonymous else None
+            )
+        )
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def get_recipe_validators(self, request):
+        pk = self.kwargs['pk']
+        if not pk.isdigit():
+            raise Http404
+        recipe = Recipe.objects.filter(pk=pk)
+        user = request.user
+        fields = ['updated_at']
+        if not user.is_anonymous:
+            recipe = recipe.annotate(
+                is_favorited=Exists(Favourite.objects.filter(
+                    recipe=OuterRef('pk'), user=user
+                )),
+                is_in_shopping_cart=Exists(Shopping.objects.filter(
+                    recipe=OuterRef('pk'), user=user
+                )),
+                is_subscribed=Exists(Follow.objects.filter(
+                    following=OuterRef('author'), user=user
+                )),
+            )
+            fields += ['is_favorited', 'is_in_shopping_cart', 'is_subscribed']
+        values = recipe.values_list(*fields).first()
+        if values is None:
+            raise Http404
+        tag = hashlib.md5(
+            f'{pk}:{values}'.encode()
+        ).hexdigest()
+        return quote_etag(tag), int(values[0].timestamp())
+
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar(self, request, pk=None):
+        """
+        Precomputed most similar recipes, see api.similarity.
+        """
+        if not pk.isdigit():
+            raise Http404
+        recipes = self.get_queryset().filter(
+            similar_to__recipe_id=pk
+        ).order_by('-similar_to__score')
+        serializer = RecipeReadSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        data = serializer.data
+        if not data and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        return Response(data)
+
+    @action(detail=False, methods=['get'], url_path='pantry')
+    def pantry(self, request):
+        """
+        Recipes ranked by the share of their ingredients found among
+        ``?ingredients=``, see api.pantry.
+        """
+        params = PantrySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        ingredients = set(params.validated_data['ingredients'])
+        limit = params.validated_data['limit']
+        # Spare results stand in for recipes deleted by other workers.
+        recipe_ids, matched, total = pantry_index.search(
+            ingredients, limit * 2, params.validated_data.get('max_missing')
+        )
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time'
+        ).in_bulk(recipe_ids.tolist())
+        missing = {}
+        for item in RecipeIngredient.objects.filter(
+            recipe_id__in=recipes
+        ).exclude(
+            ingredient_id__in=ingredients
+        ).select_related('ingredient').order_by('ingredient__name'):
+            missing.setdefault(item.recipe_id, []).append(item.ingredient)
+        found = []
+        for recipe_id, recipe_matched, recipe_total in zip(
+            recipe_ids.tolist(), matched.tolist(), total.tolist()
+        ):
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            if len(found) == limit:
+                break
+            recipe.matched = recipe_matched
+            recipe.total = recipe_total
+            recipe.coverage = round(recipe_matched / recipe_total, 4)
+            recipe.missing_ingredients = missing.get(recipe_id, [])
+            found.append(recipe)
+        serializer = PantryRecipeSerializer(
+            found, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_short_link(self, request, *args, **kwargs):
         recipe = self.get_object()
@@ -225,7 +395,8 @@ class RecipeViewSet(viewsets.ModelViewSet, AddRemoveMixin):
             model=Favourite,
             serializer_class=SimpleRecipeSerializer,
             add_message="Recipe already in favourites.",
-            remove_message="Recipe not found in favourites."
+            remove_message="Recipe not found in favourites.",
+            event=RecipeEvent.FAVOURITE
         )
 
     @action(
@@ -238,7 +409,8 @@ class RecipeViewSet(viewsets.ModelViewSet, AddRemoveMixin):
             model=Shopping,
             serializer_class=SimpleRecipeSerializer,
             add_message="Recipe already in shopping cart.",
-            remove_message="Recipe not found in shopping cart."
+            remove_message="Recipe not found in shopping cart.",
+            event=RecipeEvent.CART
         )
 
     @action(detail=False, methods=['get'], url_path='download_shopping_cart')
@@ -282,10 +454,84 @@ class ShoppingViewSet(viewsets.ModelViewSet):
         return Shopping.objects.filter(user=self.request.user)
 
 
+class ImageUploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet
+):
+    """
+    Resumable uploads: POST the file name and size to get a token,
+    PATCH raw chunks with an ``Upload-Offset`` header, GET the offset
+    to resume, then send ``upload:<token>`` as the image.
+    """
+    serializer_class = ImageUploadSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'token'
+
+    def get_queryset(self):
+        return ImageUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        prune_uploads()
+        serializer.save(user=self.request.user)
+
+    def partial_update(self, request, *args, **kwargs):
+        upload = self.get_object()
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            raise ValidationError(
+                {'detail': 'Upload-Offset and Content-Length are required.'}
+            )
+        offset = append_chunk(upload, request.stream, offset, length)
+        return Response(
+            {'offset': offset},
+            headers={'Upload-Offset': str(offset)}
+        )
+
+    def perform_destroy(self, instance):
+        delete_upload(instance)
+
+
+class BatchView(APIView):
+    """
+    Run several API calls in one request, see api.batch.
+    """
+
+    def post(self, request):
+        size = int(request.META.get('CONTENT_LENGTH') or 0)
+        if size > settings.BATCH_MAX_SIZE:
+            return Response(
+                {'detail': (
+                    f'Batch is larger than {settings.BATCH_MAX_SIZE} bytes.'
+                )},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'responses': run_batch(
+            request, serializer.validated_data['requests']
+        )})
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Only reachable inside the
+    docker network, the gateway does not proxy it.
+    """
+    return HttpResponse(
+        registry.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
 class RecipeRedirectView(APIView):
     def get(self, request, link, *args, **kwargs):
         recipe_link = get_object_or_404(RecipeLink, link=link)
         recipe = recipe_link.recipe
+        record_event(recipe.pk, RecipeEvent.REDIRECT)
         recipe_detail_url = reverse(
             'recipes-detail',
             kwargs={'pk': recipe.id}
@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from pathlib import Path
 
 
@@ -38,11 +39,14 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,25 +75,132 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 
-# Used during deployment
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('POSTGRES_DB', 'django'),
-        'USER': os.getenv('POSTGRES_USER', 'django'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
-        'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+DB_ENGINE = os.getenv('DB_ENGINE', 'postgresql')
+
+if DB_ENGINE == 'sqlite3':
+    # Used during development
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
+    }
+else:
+    # Used during deployment
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'django'),
+            'USER': os.getenv('POSTGRES_USER', 'django'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', ''),
+            'PORT': os.getenv('DB_PORT', 5432)
+        }
     }
-}
 
-# Used during development
-""" DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# Read replicas: database hosts (or SQLite file names) separated by spaces.
+# Safe-method API requests read from a random replica, see api.db_routers.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(os.getenv('DB_REPLICAS', '').split(), 1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME' if DB_ENGINE == 'sqlite3' else 'HOST': replica,
+        'TEST': {'MIRROR': 'default'},
     }
-} """
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.db_routers.PrimaryReplicaRouter']
+
+# After a write the client keeps reading from the primary for this long,
+# so that it does not miss its own changes because of replication lag.
+DATABASE_PRIMARY_PIN_SECONDS = int(
+    os.getenv('DB_PRIMARY_PIN_SECONDS', 5)
+)
+
+
+# Shared cache tier: memcached, shared by all workers and containers.
+# For local development set CACHE_BACKEND to
+# django.core.cache.backends.locmem.LocMemCache.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.memcached.PyMemcacheCache'
+)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', 'memcached:11211')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'TIMEOUT': 300,
+    },
+    # Token buckets of api.throttling: one write per request, so never
+    # a file-based cache. May point at a memcached of its own.
+    'throttle': {
+        'BACKEND': os.getenv('THROTTLE_CACHE_BACKEND', CACHE_BACKEND),
+        'LOCATION': os.getenv('THROTTLE_CACHE_LOCATION', CACHE_LOCATION),
+    },
+}
+
+# Two-tier API cache (see api.cache): in-process LRU in front of CACHES.
+API_CACHE = {
+    'alias': 'default',
+    'local_max_entries': int(os.getenv('API_CACHE_LOCAL_MAX_ENTRIES', 1024)),
+    'local_timeout': 5,
+    'version_timeout': 1,
+    'lock_timeout': 10,
+    'stale_timeout': 60,
+}
+
+
+# Directory where gunicorn workers share metric snapshots, see api.metrics.
+# Leave unset when running a single process.
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR')
+
+# Request profiles (see api.profiling): staff users send X-Profile: 1,
+# and PROFILING_SAMPLE_RATE of all requests are profiled at random.
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_DIR = os.getenv(
+    'PROFILING_DIR', os.path.join(BASE_DIR, 'profiles')
+)
+PROFILING_KEEP = 200
+
+# Queries slower than this are logged as JSON lines to SLOW_QUERY_LOG
+# (stderr when unset); summarize them with `manage.py slow_queries`.
+# An empty SLOW_QUERY_THRESHOLD_MS turns the log off.
+SLOW_QUERY_THRESHOLD_MS = os.getenv('SLOW_QUERY_THRESHOLD_MS', '100')
+SLOW_QUERY_THRESHOLD_MS = (
+    float(SLOW_QUERY_THRESHOLD_MS) if SLOW_QUERY_THRESHOLD_MS else None
+)
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': (
+            {
+                'class': 'logging.handlers.WatchedFileHandler',
+                'filename': SLOW_QUERY_LOG,
+                'formatter': 'message',
+            }
+            if SLOW_QUERY_LOG else {
+                'class': 'logging.StreamHandler',
+                'formatter': 'message',
+            }
+        ),
+    },
+    'loggers': {
+        'api.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -140,6 +251,26 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 
+    # Token buckets, see api.throttling: 'N/period' allows bursts of N.
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.AnonTokenBucketThrottle',
+        'api.throttling.UserTokenBucketThrottle',
+        'api.throttling.ScopedTokenBucketThrottle',
+        'api.throttling.GlobalScopedTokenBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_ANON', '300/min'),
+        'user': os.getenv('THROTTLE_USER', '600/min'),
+        'recipe_write': '60/hour',
+        'recipe_write_global': '20/sec',
+        'shopping_cart': '10/min',
+        'shopping_cart_global': '20/sec',
+        'short_link': '30/min',
+    },
+    # Clients are told apart by the address the gateway puts last in
+    # X-Forwarded-For.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+
 
 }
 
@@ -154,3 +285,77 @@ DJOSER = {
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Media files are named by content hash and shared, see api.storage.
+DEFAULT_FILE_STORAGE = 'api.storage.ContentAddressedStorage'
+
+# Multipart files above this size are streamed to temporary files.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# Resumable image uploads, see api.uploads.
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', os.path.join(BASE_DIR, 'uploads'))
+UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+UPLOAD_EXPIRE_HOURS = 24
+UPLOAD_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+# Similar recipes, see api.similarity. The metric is 'cosine' or 'jaccard'.
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_RECIPES_METRIC = 'cosine'
+SIMILAR_RECIPES_TAG_WEIGHT = 0.5
+
+# Popular and trending recipes, see api.popularity. Event weights
+# by kind and the time in which an event loses half its weight.
+RECIPE_SCORE_WEIGHTS = {'favourite': 3, 'cart': 2, 'redirect': 1}
+RECIPE_SCORE_HALF_LIVES = {
+    'popular': timedelta(days=30),
+    'trending': timedelta(days=1),
+}
+
+# Listings with more rows than this report an estimated count, see
+# api.pagination. Outside PostgreSQL, such counts are cached instead.
+PAGINATION_ESTIMATE_THRESHOLD = 10000
+PAGINATION_COUNT_TIMEOUT = 60
+
+# Background jobs, see api.jobs. With JOBS_EAGER, tasks run in the
+# web process right after commit and no worker is needed.
+JOBS_EAGER = bool(os.getenv('JOBS_EAGER', default=False))
+JOBS_PROCESSES = int(os.getenv('JOBS_PROCESSES', 1))
+JOBS_THREADS = int(os.getenv('JOBS_THREADS', 4))
+JOBS_POLL_INTERVAL = 1
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 10
+JOBS_RETRY_MAX_DELAY = 60 * 60
+# A job still running after this many seconds is handed to another worker.
+JOBS_LEASE = 10 * 60
+
+# Batched API calls, see api.batch. MAX_SIZE is in bytes.
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_SIZE = 64 * 1024
+BATCH_METHODS = ('GET',)
+
+# Recipe event streams, see api.events. HEARTBEAT and FOLLOWS_REFRESH
+# are in seconds, QUEUE_SIZE in events per stream and MAX_CONNECTIONS
+# is per process.
+EVENTS_CHANNEL = 'recipe_events'
+EVENTS_HEARTBEAT = 15
+EVENTS_QUEUE_SIZE = 100
+EVENTS_MAX_CONNECTIONS = 10000
+EVENTS_FOLLOWS_REFRESH = 60
+EVENTS_REPLAY_LIMIT = 50
+
+# nginx maps written by export_gateway_config for the cached gateway.
+GATEWAY_CONFIG = os.getenv(
+    'GATEWAY_CONFIG', os.path.join(BASE_DIR, 'gateway', 'foodgram.conf')
+)
+# Per-minute logs of the short links it redirects, read back by
+# refresh_recipe_scores.
+GATEWAY_REDIRECT_LOG_DIR = os.getenv(
+    'GATEWAY_REDIRECT_LOG_DIR',
+    os.path.join(BASE_DIR, 'gateway', 'short_links')
+)
+
+# Pantry search, see api.pantry. The index is rebuilt after MAX_AGE seconds.
+PANTRY_INDEX_MAX_AGE = 60 * 60
+PANTRY_MAX_INGREDIENTS = 100
+PANTRY_RESULTS = 10
+PANTRY_MAX_RESULTS = 50
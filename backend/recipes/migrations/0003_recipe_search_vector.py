@@ -0,0 +1,139 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:45
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+CREATE_SEARCH_TRIGGERS = """
+CREATE FUNCTION recipes_recipe_search_vector(
+    p_name text, p_text text, p_recipe_id bigint
+) RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('russian', coalesce(p_name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(p_text, '')), 'B')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM recipes_recipeingredient ri
+            JOIN recipes_ingredient i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = p_recipe_id
+        ), '')), 'C');
+$$ LANGUAGE sql STABLE;
+
+CREATE FUNCTION recipes_recipe_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := recipes_recipe_search_vector(
+        NEW.name, NEW.text, NEW.id
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_recipe_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_trigger();
+
+CREATE FUNCTION recipes_recipeingredient_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE recipes_recipe r
+        SET search_vector = recipes_recipe_search_vector(r.name, r.text, r.id)
+        WHERE r.id IN (SELECT DISTINCT recipe_id FROM changed_rows_old);
+    ELSE
+        UPDATE recipes_recipe r
+        SET search_vector = recipes_recipe_search_vector(r.name, r.text, r.id)
+        WHERE r.id IN (SELECT DISTINCT recipe_id FROM changed_rows_new);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_recipeingredient_search_vector_insert
+    AFTER INSERT ON recipes_recipeingredient
+    REFERENCING NEW TABLE AS changed_rows_new
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_recipeingredient_search_vector_trigger();
+
+CREATE TRIGGER recipes_recipeingredient_search_vector_update
+    AFTER UPDATE ON recipes_recipeingredient
+    REFERENCING NEW TABLE AS changed_rows_new
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_recipeingredient_search_vector_trigger();
+
+CREATE TRIGGER recipes_recipeingredient_search_vector_delete
+    AFTER DELETE ON recipes_recipeingredient
+    REFERENCING OLD TABLE AS changed_rows_old
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION recipes_recipeingredient_search_vector_trigger();
+
+CREATE FUNCTION recipes_ingredient_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE recipes_recipe r
+    SET search_vector = recipes_recipe_search_vector(r.name, r.text, r.id)
+    WHERE r.id IN (
+        SELECT recipe_id FROM recipes_recipeingredient
+        WHERE ingredient_id = NEW.id
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_ingredient_search_vector_update
+    AFTER UPDATE OF name ON recipes_ingredient
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION recipes_ingredient_search_vector_trigger();
+
+CREATE INDEX recipes_recipe_search_vector_gin
+    ON recipes_recipe USING gin (search_vector);
+
+UPDATE recipes_recipe
+SET search_vector = recipes_recipe_search_vector(name, text, id);
+"""
+
+DROP_SEARCH_TRIGGERS = """
+DROP INDEX IF EXISTS recipes_recipe_search_vector_gin;
+DROP TRIGGER IF EXISTS recipes_ingredient_search_vector_update
+    ON recipes_ingredient;
+DROP TRIGGER IF EXISTS recipes_recipeingredient_search_vector_delete
+    ON recipes_recipeingredient;
+DROP TRIGGER IF EXISTS recipes_recipeingredient_search_vector_update
+    ON recipes_recipeingredient;
+DROP TRIGGER IF EXISTS recipes_recipeingredient_search_vector_insert
+    ON recipes_recipeingredient;
+DROP TRIGGER IF EXISTS recipes_recipe_search_vector_update
+    ON recipes_recipe;
+DROP FUNCTION IF EXISTS recipes_ingredient_search_vector_trigger();
+DROP FUNCTION IF EXISTS recipes_recipeingredient_search_vector_trigger();
+DROP FUNCTION IF EXISTS recipes_recipe_search_vector_trigger();
+DROP FUNCTION IF EXISTS recipes_recipe_search_vector(text, text, bigint);
+"""
+
+
+def create_search_triggers(apps, schema_editor):
+    """
+    The search vector is maintained by PostgreSQL triggers, so bulk
+    inserts and admin edits keep it current. Other backends skip it.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_TRIGGERS)
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Search vector'),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
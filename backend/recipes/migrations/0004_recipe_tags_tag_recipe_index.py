@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_search_vector'),
+    ]
+
+    operations = [
+        # The auto-created recipe_tags table only has the unique
+        # (recipe_id, tag_id) index plus single-column FK indexes.
+        # (tag_id, recipe_id) lets tag filters answer from the index alone.
+        migrations.RunSQL(
+            'CREATE INDEX recipes_recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX recipes_recipe_tags_tag_recipe_idx;',
+        ),
+    ]
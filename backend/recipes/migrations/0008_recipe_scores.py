@@ -0,0 +1,75 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_scores(apps, schema_editor):
+    """
+    Give every recipe a score row and turn the current favourites
+    and cart entries into events for the first refresh.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeEvent = apps.get_model('recipes', 'RecipeEvent')
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    RecipeScore.objects.bulk_create(
+        (RecipeScore(recipe_id=pk) for pk in
+         Recipe.objects.values_list('pk', flat=True).iterator()),
+        batch_size=1000
+    )
+    for model, kind in (('Favourite', 1), ('Shopping', 2)):
+        RecipeEvent.objects.bulk_create(
+            (RecipeEvent(recipe_id=recipe_id, kind=kind) for recipe_id in
+             apps.get_model('recipes', model).objects
+             .exclude(recipe=None)
+             .values_list('recipe_id', flat=True).iterator()),
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Added to favourites'), (2, 'Added to shopping cart'), (3, 'Short link followed')], verbose_name='Kind')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+            options={
+                'verbose_name': 'Recipe event',
+                'verbose_name_plural': 'Recipe events',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='recipes.recipe', verbose_name='Recipe')),
+                ('popular', models.FloatField(default=0, verbose_name='Popularity')),
+                ('trending', models.FloatField(default=0, verbose_name='Trend')),
+            ],
+            options={
+                'verbose_name': 'Recipe score',
+                'verbose_name_plural': 'Recipe scores',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-popular', '-recipe'], name='recipe_score_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-trending', '-recipe'], name='recipe_score_trending_idx'),
+        ),
+        migrations.AddField(
+            model_name='recipeevent',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Recipe'),
+        ),
+        migrations.RunPython(create_scores, migrations.RunPython.noop),
+    ]
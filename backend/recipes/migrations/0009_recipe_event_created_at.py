@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:59
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipeevent',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created at'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_event_created_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingredient',
+            name='measurement_unit',
+            field=models.CharField(choices=[('г', 'г'), ('мл', 'мл'), ('ст.л.', 'ст. ложек'), ('ч.л.', 'ч. ложек'), ('шт', 'шт.')], max_length=3, verbose_name='Measurement unit'),
+        ),
+    ]
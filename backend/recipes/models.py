@@ -1,8 +1,10 @@
 import random
 import string
 
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 from users.models import User
 
@@ -73,6 +75,7 @@ class Recipe(models.Model):
         on_delete=models.CASCADE,
         related_name='recipes',
         verbose_name='Author',
+        db_index=False,
     )
     name = models.CharField(
         max_length=255,
@@ -100,11 +103,20 @@ class Recipe(models.Model):
         verbose_name='Publication date',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Last modified',
+        auto_now=True,
+    )
     tags = models.ManyToManyField(
         Tag,
         verbose_name='Tags',
         related_name='recipes',
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Search vector',
+    )
 
     class Meta:
         verbose_name = "Recipe"
@@ -116,6 +128,16 @@ class Recipe(models.Model):
                 name='unique_recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_id_idx'
+            ),
+            models.Index(
+                fields=['-pub_date'],
+                name='recipe_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Recipe: {self.name}; Author: {self.author};'
@@ -130,12 +152,14 @@ class Favourite(models.Model):
         on_delete=models.CASCADE,
         related_name='favourites',
         verbose_name='User',
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name='favorites',
         verbose_name='Recipe',
+        db_index=False,
     )
 
     class Meta:
@@ -147,6 +171,12 @@ class Favourite(models.Model):
                 name='unique_favourite'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='favourite_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'User: {self.user}; Recipe: {self.recipe};'
@@ -160,6 +190,7 @@ class Shopping(models.Model):
         User, on_delete=models.CASCADE,
         related_name='shopping',
         verbose_name='User',
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -168,6 +199,7 @@ class Shopping(models.Model):
         blank=True,
         related_name='shopping',
         verbose_name='Recipe',
+        db_index=False,
     )
 
     class Meta:
@@ -179,6 +211,12 @@ class Shopping(models.Model):
                 name='unique_shopping'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='shopping_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'User: {self.user}; Recipe: {self.recipe};'
@@ -258,3 +296,117 @@ class RecipeLink(models.Model):
             link = ''.join(random.choices(characters, k=length))
             if not RecipeLink.objects.filter(link=link).exists():
                 return link
+
+
+class SimilarRecipe(models.Model):
+    """
+    Model for precomputed nearest neighbours of a recipe.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Recipe',
+        db_index=False,
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Similar recipe',
+    )
+    score = models.FloatField(
+        verbose_name='Similarity',
+    )
+
+    class Meta:
+        verbose_name = "Similar recipe"
+        verbose_name_plural = "Similar recipes"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'Recipe: {self.recipe_id}; Similar: {self.similar_id};'
+
+
+class RecipeEvent(models.Model):
+    """
+    Model for popularity events not yet folded into recipe scores.
+    """
+    FAVOURITE = 1
+    CART = 2
+    REDIRECT = 3
+    KIND_CHOICES = (
+        (FAVOURITE, 'Added to favourites'),
+        (CART, 'Added to shopping cart'),
+        (REDIRECT, 'Short link followed'),
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Recipe',
+        db_index=False,
+    )
+    kind = models.PositiveSmallIntegerField(
+        choices=KIND_CHOICES,
+        verbose_name='Kind',
+    )
+    # Not auto_now_add: redirects read from the gateway logs keep the
+    # time they were answered.
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Created at',
+    )
+
+    class Meta:
+        verbose_name = "Recipe event"
+        verbose_name_plural = "Recipe events"
+
+
+class RecipeScore(models.Model):
+    """
+    Model for time-decayed recipe popularity, see api.popularity.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Recipe',
+    )
+    popular = models.FloatField(
+        default=0,
+        verbose_name='Popularity',
+    )
+    trending = models.FloatField(
+        default=0,
+        verbose_name='Trend',
+    )
+
+    class Meta:
+        verbose_name = "Recipe score"
+        verbose_name_plural = "Recipe scores"
+        indexes = [
+            models.Index(
+                fields=['-popular', '-recipe'],
+                name='recipe_score_popular_idx'
+            ),
+            models.Index(
+                fields=['-trending', '-recipe'],
+                name='recipe_score_trending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'Recipe: {self.recipe_id}; Trend: {self.trending};'
@@ -0,0 +1,64 @@
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+# User fields that are part of a recipe's representation.
+AUTHOR_FIELDS = {
+    'email', 'username', 'first_name', 'last_name', 'avatar'
+}
+
+
+def touch_recipes(**lookup):
+    Recipe.objects.filter(**lookup).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Tag)
+def touch_tag_recipes(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(tags=instance)
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_deleted_tag_recipes(sender, instance, **kwargs):
+    # Before the delete, the links to the recipes cascade away with it.
+    touch_recipes(tags=instance)
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(recipe_ingredients__ingredient=instance)
+
+
+@receiver(pre_delete, sender=Ingredient)
+def touch_deleted_ingredient_recipes(sender, instance, **kwargs):
+    touch_recipes(recipe_ingredients__ingredient=instance)
+
+
+@receiver(pre_save, sender=User)
+def compare_author_fields(sender, instance, update_fields, **kwargs):
+    """
+    Note whether the save changes what recipes show of their author.
+    A full save, like djoser's set_password, usually does not.
+    """
+    fields = AUTHOR_FIELDS
+    if update_fields is not None:
+        fields = AUTHOR_FIELDS & set(update_fields)
+    instance._author_changed = False
+    if instance.pk is None or not fields:
+        return
+    stored = User.objects.filter(pk=instance.pk).values(*fields).first()
+    # An empty avatar is stored as '' but may be None on the instance.
+    instance._author_changed = stored is not None and any(
+        (getattr(instance, field) or None) != (value or None)
+        for field, value in stored.items()
+    )
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created, **kwargs):
+    if not created and instance._author_changed:
+        touch_recipes(author=instance)
@@ -0,0 +1,38 @@
+import pytest
+from django.core.cache import caches
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.cache import api_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+    api_cache.local.entries.clear()
+    api_cache.versions.clear()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        username='cook', email='cook@example.com', password='password',
+        first_name='Cook', last_name='Book'
+    )
+
+
+@pytest.fixture
+def another_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username='baker', email='baker@example.com', password='password',
+        first_name='Baker', last_name='Bread'
+    )
+
+
+@pytest.fixture
+def user_client(user):
+    token = Token.objects.create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
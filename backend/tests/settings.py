@@ -0,0 +1,37 @@
+import tempfile
+
+from backend.settings import *  # noqa
+
+TEST_DIR = tempfile.mkdtemp(prefix='foodgram_tests_')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(TEST_DIR, 'db.sqlite3'),  # noqa: F405
+    },
+    'replica_1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(TEST_DIR, 'replica.sqlite3'),  # noqa: F405
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+# Tests of replica routing enable the replica, see test_db_routers.
+DATABASE_REPLICAS = []
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+    },
+}
+
+MEDIA_ROOT = os.path.join(TEST_DIR, 'media')  # noqa: F405
+UPLOAD_DIR = os.path.join(TEST_DIR, 'uploads')  # noqa: F405
+PROFILING_DIR = os.path.join(TEST_DIR, 'profiles')  # noqa: F405
+GATEWAY_CONFIG = os.path.join(TEST_DIR, 'gateway.conf')  # noqa: F405
+METRICS_MULTIPROC_DIR = None
+JOBS_EAGER = False
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -0,0 +1,59 @@
+import pytest
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from api.serializers import BatchItemSerializer
+from recipes.models import Recipe
+
+pytestmark = pytest.mark.django_db
+
+
+def batch(client, *requests, **headers):
+    response = client.post(
+        '/api/batch/',
+        {'requests': [
+            {'method': method, 'path': path} for method, path in requests
+        ]},
+        format='json',
+        **headers
+    )
+    assert response.status_code == 200
+    return response.data['responses']
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    monkeypatch.setitem(
+        BatchItemSerializer._declared_fields, 'method',
+        serializers.ChoiceField(choices=('GET', 'POST', 'DELETE'))
+    )
+
+
+def test_conditional_headers_are_not_passed_on(user_client, user):
+    recipe = Recipe.objects.create(
+        author=user, name='Soup', text='Boil.', cooking_time=10
+    )
+    path = f'/api/recipes/{recipe.pk}/'
+    etag = user_client.get(path)['ETag']
+    response, = batch(user_client, ('GET', path), HTTP_IF_NONE_MATCH=etag)
+    assert response['status'] == 200
+    assert response['body']['id'] == recipe.pk
+
+
+def test_anonymous_sub_requests_are_unauthorized():
+    response, = batch(APIClient(), ('GET', '/api/users/me/'))
+    assert response['status'] == 401
+    assert response['headers']['WWW-Authenticate'] == 'Token'
+
+
+def test_writes_drop_answered_reads(user_client, another_user, writes):
+    path = f'/api/users/{another_user.pk}/'
+    before, subscribed, after = batch(
+        user_client,
+        ('GET', path),
+        ('POST', f'{path}subscribe/'),
+        ('GET', path),
+    )
+    assert subscribed['status'] == 201
+    assert before['body']['is_subscribed'] is False
+    assert after['body']['is_subscribed'] is True
@@ -0,0 +1,87 @@
+import gzip
+import json
+import os
+
+import pytest
+from django.core.management import call_command
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def recipes(user, settings):
+    # Images are only kept when the file is in the storage.
+    image = os.path.join(settings.MEDIA_ROOT, 'recipes', 'ab', 'soup.png')
+    os.makedirs(os.path.dirname(image), exist_ok=True)
+    with open(image, 'wb') as file:
+        file.write(b'png')
+    lunch = Tag.objects.create(name='Lunch', slug='lunch')
+    hot = Tag.objects.create(name='Hot', slug='hot')
+    water = Ingredient.objects.create(name='Water', measurement_unit='ml')
+    salt = Ingredient.objects.create(name='Salt', measurement_unit='g')
+    soup = Recipe.objects.create(
+        author=user, name='Soup', text='Boil.', cooking_time=10,
+        image='recipes/ab/soup.png'
+    )
+    soup.tags.set([lunch, hot])
+    RecipeIngredient.objects.create(recipe=soup, ingredient=water, amount=500)
+    RecipeIngredient.objects.create(recipe=soup, ingredient=salt, amount=5)
+    tea = Recipe.objects.create(
+        author=user, name='Tea', text='Steep.', cooking_time=3
+    )
+    tea.tags.set([hot])
+    RecipeIngredient.objects.create(recipe=tea, ingredient=water, amount=250)
+    return [soup, tea]
+
+
+def export(path):
+    call_command('export_recipes', str(path))
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def comparable(records):
+    """
+    Records without their ids, tags in no particular order.
+    """
+    return [
+        {
+            **{key: value for key, value in record.items() if key != 'id'},
+            'tags': sorted(record['tags'], key=lambda tag: tag['slug']),
+        }
+        for record in records
+    ]
+
+
+def test_export_import_round_trip(recipes, tmp_path):
+    exported = export(tmp_path / 'recipes.ndjson.gz')
+    assert [record['id'] for record in exported] == [
+        recipe.pk for recipe in recipes
+    ]
+    Recipe.objects.all().delete()
+    Tag.objects.all().delete()
+    Ingredient.objects.all().delete()
+    User.objects.all().delete()
+
+    id_map = tmp_path / 'ids.csv'
+    call_command(
+        'import_recipes', str(tmp_path / 'recipes.ndjson.gz'),
+        id_map=str(id_map)
+    )
+
+    reexported = export(tmp_path / 'again.ndjson.gz')
+    assert comparable(reexported) == comparable(exported)
+    assert id_map.read_text().splitlines() == [
+        f'{old["id"]},{new["id"]}'
+        for old, new in zip(exported, reexported)
+    ]
+    assert not User.objects.get().has_usable_password()
+
+
+def test_import_skips_recipes_the_author_has(recipes, tmp_path):
+    export(tmp_path / 'recipes.ndjson.gz')
+    call_command('import_recipes', str(tmp_path / 'recipes.ndjson.gz'))
+    assert Recipe.objects.count() == len(recipes)
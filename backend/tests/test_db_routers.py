@@ -0,0 +1,72 @@
+import pytest
+
+from api.db_routers import (PRIMARY, PrimaryReplicaRouter, RoutingState,
+                            routing_state)
+from api.middleware import PRIMARY_PIN_COOKIE
+
+# The replica mirrors the primary: it only sees committed rows.
+pytestmark = pytest.mark.django_db(transaction=True, databases='__all__')
+
+
+@pytest.fixture(autouse=True)
+def replica(settings):
+    settings.DATABASE_REPLICAS = ['replica_1']
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """
+    Databases the router sends reads to.
+    """
+    chosen = []
+    db_for_read = PrimaryReplicaRouter.db_for_read
+
+    def spy(self, model, **hints):
+        alias = db_for_read(self, model, **hints)
+        chosen.append(alias)
+        return alias
+
+    monkeypatch.setattr(PrimaryReplicaRouter, 'db_for_read', spy)
+    return chosen
+
+
+def test_reads_go_to_primary_outside_requests():
+    assert PrimaryReplicaRouter().db_for_read(None) == PRIMARY
+
+
+def test_write_pins_the_rest_of_the_request():
+    router = PrimaryReplicaRouter()
+    state = RoutingState(use_primary=False)
+    token = routing_state.set(state)
+    try:
+        assert router.db_for_read(None) == 'replica_1'
+        assert router.db_for_write(None) == PRIMARY
+        assert state.wrote
+        assert router.db_for_read(None) == PRIMARY
+    finally:
+        routing_state.reset(token)
+
+
+def test_safe_request_reads_from_replica(user_client, reads):
+    response = user_client.get('/api/tags/')
+    assert response.status_code == 200
+    assert 'replica_1' in reads
+    assert PRIMARY_PIN_COOKIE not in response.cookies
+
+
+def test_client_is_pinned_to_primary_after_write(
+    user_client, another_user, reads
+):
+    response = user_client.post(f'/api/users/{another_user.pk}/subscribe/')
+    assert response.status_code == 201
+    cookie = response.cookies[PRIMARY_PIN_COOKIE]
+    assert cookie['max-age'] == 5
+    reads.clear()
+    response = user_client.get('/api/users/subscriptions/')
+    assert response.status_code == 200
+    assert reads and set(reads) == {PRIMARY}
+    # Without the cookie, once it expires, reads go back to replicas.
+    user_client.cookies.clear()
+    reads.clear()
+    user_client.get('/api/users/subscriptions/')
+    assert 'replica_1' in reads
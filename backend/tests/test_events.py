@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from api.events import (
+    RESYNC, Broker, Subscription, get_missed, recipe_event, token_key
+)
+from recipes.models import Recipe
+
+
+def scope(headers=(), query_string=b''):
+    return {'headers': list(headers), 'query_string': query_string}
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def queued(subscription):
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def test_token_from_header_or_cookie():
+    assert token_key(scope([(b'authorization', b'Token abc')])) == 'abc'
+    assert token_key(scope([(b'cookie', b'theme=dark; token=abc')])) == 'abc'
+
+
+def test_token_is_not_read_from_query_string():
+    assert token_key(scope(query_string=b'token=abc')) is None
+
+
+def test_events_reach_followers_of_the_author(loop):
+    broker = Broker()
+    fan = Subscription(1, {10, 20}, loop)
+    other = Subscription(2, {30}, loop)
+    gone = Subscription(3, {10}, loop)
+    for subscription in (fan, other, gone):
+        broker.subscribe(subscription)
+    broker.unsubscribe(gone)
+    broker.publish({'id': 1, 'author': 10})
+    broker.update(other, {10})
+    broker.publish({'id': 2, 'author': 10})
+    broker.publish({'id': 3, 'author': 30})
+    # Events are queued on the loop of each subscription.
+    loop.run_until_complete(asyncio.sleep(0))
+    assert [event['id'] for event in queued(fan)] == [1, 2]
+    assert [event['id'] for event in queued(other)] == [2]
+    assert queued(gone) == []
+    assert len(broker) == 2
+    assert set(broker.by_author) == {10, 20}
+
+
+def test_full_queue_is_replaced_by_resync(loop, settings):
+    settings.EVENTS_QUEUE_SIZE = 2
+    subscription = Subscription(1, {10}, loop)
+    for pk in range(3):
+        subscription.put({'id': pk, 'author': 10})
+    assert queued(subscription) == [RESYNC]
+    subscription.put({'id': 3, 'author': 10})
+    assert [event['id'] for event in queued(subscription)] == [3]
+
+
+# get_missed() queries from a thread of its own.
+@pytest.mark.django_db(transaction=True)
+def test_missed_recipes_replayed_oldest_first(
+    user, another_user, loop, settings
+):
+    settings.EVENTS_REPLAY_LIMIT = 2
+    recipes = [
+        Recipe.objects.create(
+            author=author, name=name, text='Boil.', cooking_time=10
+        )
+        for author, name in (
+            (user, 'Soup'), (user, 'Stew'),
+            (another_user, 'Bread'), (user, 'Broth')
+        )
+    ]
+    missed = loop.run_until_complete(get_missed({user.pk}, 0))
+    assert missed == [recipe_event(recipes[1]), recipe_event(recipes[3])]
+    missed = loop.run_until_complete(get_missed({user.pk}, recipes[1].pk))
+    assert missed == [recipe_event(recipes[3])]
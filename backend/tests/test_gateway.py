@@ -0,0 +1,54 @@
+import os
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from api.gateway import ingest_redirect_logs
+from recipes.models import Recipe, RecipeEvent, RecipeLink
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def recipe(user):
+    recipe = Recipe.objects.create(
+        author=user, name='Soup', text='Boil.', cooking_time=10
+    )
+    RecipeLink.objects.create(recipe=recipe, link='AbC123')
+    return recipe
+
+
+def write_log(directory, name, lines, age):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as file:
+        file.write(''.join(f'{line}\n' for line in lines))
+    modified_at = time.time() - age
+    os.utime(path, (modified_at, modified_at))
+    return path
+
+
+def test_finished_logs_become_redirect_events(recipe, tmp_path):
+    finished = write_log(tmp_path, '2026-10-19-0958.log', [
+        '1792403880.250 AbC123',
+        '1792403881.500 abc123',
+        '1792403882.000 gone42',
+    ], age=120)
+    current = write_log(tmp_path, '2026-10-19-1000.log', [
+        '1792404000.000 AbC123',
+    ], age=5)
+
+    assert ingest_redirect_logs(tmp_path) == 2
+
+    events = RecipeEvent.objects.order_by('created_at')
+    assert [event.recipe_id for event in events] == [recipe.pk] * 2
+    assert {event.kind for event in events} == {RecipeEvent.REDIRECT}
+    assert events[0].created_at == datetime.fromtimestamp(
+        1792403880.25, timezone.utc
+    )
+    assert not os.path.exists(finished)
+    assert os.path.exists(current)
+
+
+def test_missing_log_directory_is_skipped(tmp_path):
+    assert ingest_redirect_logs(tmp_path / 'missing') == 0
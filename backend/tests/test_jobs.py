@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from api.jobs import claim_jobs, run_job, task
+from api.models import Job
+
+pytestmark = pytest.mark.django_db
+
+calls = []
+
+
+@task(max_attempts=2)
+def flaky(fail):
+    calls.append(fail)
+    if fail:
+        raise ValueError('Not today.')
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+def claim():
+    jobs = claim_jobs(limit=10)
+    assert len(jobs) <= 1
+    return jobs[0] if jobs else None
+
+
+def make_due(job):
+    Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+
+def test_finished_job_is_deleted():
+    flaky.delay(False)
+    assert run_job(claim()) == 'done'
+    assert calls == [False]
+    assert not Job.objects.exists()
+
+
+def test_claimed_job_is_leased(settings):
+    job = flaky.delay(False)
+    claimed = claim()
+    assert claimed.pk == job.pk
+    assert claimed.attempts == 1
+    lease = Job.objects.get().run_at - timezone.now()
+    assert timedelta(seconds=settings.JOBS_LEASE - 5) < lease
+    assert claim() is None
+
+
+def test_failing_job_is_retried_then_failed(settings):
+    settings.JOBS_RETRY_BACKOFF = 10
+    flaky.delay(True)
+
+    assert run_job(claim()) == 'retried'
+    job = Job.objects.get()
+    assert job.failed_at is None
+    assert 'ValueError: Not today.' in job.error
+    delay = job.run_at - timezone.now()
+    assert timedelta(seconds=4) < delay <= timedelta(seconds=15)
+    assert claim() is None
+
+    make_due(job)
+    assert run_job(claim()) == 'failed'
+    job = Job.objects.get()
+    assert job.attempts == 2
+    assert job.failed_at is not None
+    assert calls == [True, True]
+    make_due(job)
+    assert claim() is None
@@ -0,0 +1,66 @@
+import pytest
+from django.core.paginator import EmptyPage, PageNotAnInteger
+
+from api.pagination import EstimatedCountPaginator
+from recipes.models import Tag
+
+pytestmark = pytest.mark.django_db
+
+
+def add_tags(start, stop):
+    Tag.objects.bulk_create(
+        Tag(name=f'Tag {number}', slug=f'tag-{number}')
+        for number in range(start, stop)
+    )
+
+
+def paginator():
+    return EstimatedCountPaginator(Tag.objects.order_by('id'), 2)
+
+
+@pytest.fixture(autouse=True)
+def threshold(settings):
+    settings.PAGINATION_ESTIMATE_THRESHOLD = 5
+
+
+def test_small_results_are_counted_exactly():
+    add_tags(0, 4)
+    first = paginator()
+    assert (first.count, first.approximate) == (4, False)
+    second = paginator()
+    assert (second.count, second.approximate) == (4, False)
+    with pytest.raises(EmptyPage):
+        second.page(3)
+
+
+def test_large_results_page_past_a_stale_estimate():
+    add_tags(0, 6)
+    counted = paginator()
+    assert (counted.count, counted.approximate) == (6, False)
+    add_tags(6, 10)
+
+    estimated = paginator()
+    assert (estimated.count, estimated.approximate) == (6, True)
+    page = estimated.page(3)
+    assert [tag.slug for tag in page] == ['tag-4', 'tag-5']
+    assert page.has_next()
+    # One row past the page proves the count is larger.
+    assert estimated.count == 7
+
+    estimated = paginator()
+    page = estimated.page(5)
+    assert [tag.slug for tag in page] == ['tag-8', 'tag-9']
+    assert not page.has_next()
+    # The last page gives the exact count.
+    assert estimated.count == 10
+    with pytest.raises(EmptyPage):
+        paginator().page(6)
+
+
+def test_estimated_page_numbers_are_validated():
+    add_tags(0, 6)
+    paginator().count
+    with pytest.raises(PageNotAnInteger):
+        paginator().page('x')
+    with pytest.raises(EmptyPage):
+        paginator().page(0)
@@ -0,0 +1,53 @@
+import pytest
+
+from api import popularity
+from api.popularity import record_event, refresh_scores
+from recipes.models import Recipe, RecipeEvent, RecipeScore
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def recipe(user):
+    return Recipe.objects.create(
+        author=user, name='Soup', text='Boil.', cooking_time=10
+    )
+
+
+def test_events_are_folded_into_scores(recipe):
+    record_event(recipe.pk, RecipeEvent.FAVOURITE)
+    record_event(recipe.pk, RecipeEvent.CART)
+    assert refresh_scores() == 2
+    assert not RecipeEvent.objects.exists()
+    score = RecipeScore.objects.get(recipe=recipe)
+    assert score.popular > 0 and score.trending > 0
+
+
+def test_event_committed_late_with_lower_id_survives(recipe, monkeypatch):
+    first = RecipeEvent.objects.create(
+        recipe=recipe, kind=RecipeEvent.FAVOURITE
+    )
+    skipped = RecipeEvent.objects.create(
+        recipe=recipe, kind=RecipeEvent.CART
+    )
+    last = RecipeEvent.objects.create(
+        recipe=recipe, kind=RecipeEvent.REDIRECT
+    )
+    skipped_id = skipped.pk
+    skipped.delete()
+    decay_rates = popularity.decay_rates
+
+    def commit_late_event():
+        # Another transaction got its id before the last event and
+        # commits only after the refresh read the pending events.
+        RecipeEvent.objects.create(
+            pk=skipped_id, recipe=recipe, kind=RecipeEvent.CART
+        )
+        return decay_rates()
+
+    monkeypatch.setattr(popularity, 'decay_rates', commit_late_event)
+    assert refresh_scores() == 2
+    assert list(RecipeEvent.objects.values_list('pk', flat=True)) == [
+        skipped_id
+    ]
+    assert first.pk < skipped_id < last.pk
@@ -0,0 +1,68 @@
+import pytest
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def recipe(user):
+    recipe = Recipe.objects.create(
+        author=user, name='Soup', text='Boil.', cooking_time=10
+    )
+    recipe.tags.add(Tag.objects.create(name='Lunch', slug='lunch'))
+    RecipeIngredient.objects.create(
+        recipe=recipe,
+        ingredient=Ingredient.objects.create(
+            name='Water', measurement_unit='ml'
+        ),
+        amount=500
+    )
+    return recipe
+
+
+def get_recipe(client, recipe):
+    detail = client.get(f'/api/recipes/{recipe.pk}/')
+    assert detail.status_code == 200
+    listed = client.get('/api/recipes/').data['results']
+    assert [item['id'] for item in listed] == [recipe.pk]
+    return detail, listed[0]
+
+
+@pytest.mark.parametrize('field, model', [
+    ('tags', Tag),
+    ('ingredients', Ingredient),
+])
+def test_deleted_items_leave_recipe_responses(
+    user_client, recipe, field, model
+):
+    detail, listed = get_recipe(user_client, recipe)
+    assert len(detail.data[field]) == 1
+    assert len(listed[field]) == 1
+
+    model.objects.get().delete()
+
+    revalidated = user_client.get(
+        f'/api/recipes/{recipe.pk}/', HTTP_IF_NONE_MATCH=detail['ETag']
+    )
+    assert revalidated.status_code == 200
+    assert revalidated['ETag'] != detail['ETag']
+    assert revalidated.data[field] == []
+    _, listed = get_recipe(user_client, recipe)
+    assert listed[field] == []
+
+
+def test_password_change_keeps_recipe_etags(user, recipe):
+    updated_at = Recipe.objects.get().updated_at
+    user.set_password('another password')
+    user.save()
+    assert Recipe.objects.get().updated_at == updated_at
+    user.first_name = 'Chef'
+    user.save()
+    assert Recipe.objects.get().updated_at > updated_at
+
+
+def test_detail_varies_on_accept_and_authorization(user_client, recipe):
+    response = user_client.get(f'/api/recipes/{recipe.pk}/')
+    vary = {value.strip() for value in response['Vary'].split(',')}
+    assert vary >= {'Accept', 'Authorization'}
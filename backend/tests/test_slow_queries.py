@@ -0,0 +1,54 @@
+import json
+import logging
+
+import pytest
+from django.db import connection
+
+from api.middleware import QueryTimer
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def slow_queries(caplog):
+    logger = logging.getLogger('api.slow_queries')
+    logger.addHandler(caplog.handler)
+    yield lambda: [json.loads(record.message) for record in caplog.records]
+    logger.removeHandler(caplog.handler)
+
+
+def test_slow_queries_are_logged_with_action(
+    user_client, settings, slow_queries
+):
+    settings.SLOW_QUERY_THRESHOLD_MS = 0
+    user_client.get('/api/recipes/')
+    entries = slow_queries()
+    assert entries
+    assert {entry['action'] for entry in entries} == {'recipes.list'}
+    # The frame of the execute wrapper itself is skipped.
+    assert 'api/pagination.py:counted' in {
+        entry['frame'] for entry in entries
+    }
+
+
+def test_empty_threshold_turns_the_log_off(
+    user_client, settings, slow_queries
+):
+    settings.SLOW_QUERY_THRESHOLD_MS = None
+    assert user_client.get('/api/recipes/').status_code == 200
+    assert slow_queries() == []
+
+
+def test_queries_go_through_one_execute_wrapper(
+    user_client, monkeypatch
+):
+    wrappers = []
+    call = QueryTimer.__call__
+
+    def spy(self, execute, sql, params, many, context):
+        wrappers.append(len(connection.execute_wrappers))
+        return call(self, execute, sql, params, many, context)
+
+    monkeypatch.setattr(QueryTimer, '__call__', spy)
+    user_client.get('/api/recipes/')
+    assert wrappers and set(wrappers) == {1}
@@ -0,0 +1,53 @@
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from api.models import MediaBlob
+from api.storage import acquire, release
+
+
+def save_and_release(capture):
+    name = default_storage.save('recipes/soup.png', ContentFile(b'soup'))
+    acquire(name)
+    with capture() as callbacks:
+        release(name)
+    return name, callbacks
+
+
+@pytest.mark.django_db
+def test_last_release_deletes_the_file(django_capture_on_commit_callbacks):
+    name, callbacks = save_and_release(django_capture_on_commit_callbacks)
+    for callback in callbacks:
+        callback()
+    assert not default_storage.exists(name)
+    assert not MediaBlob.objects.filter(name=name).exists()
+
+
+@pytest.mark.django_db
+def test_saving_again_before_the_orphan_is_deleted_keeps_the_file(
+    django_capture_on_commit_callbacks
+):
+    name, callbacks = save_and_release(django_capture_on_commit_callbacks)
+    # Not referenced yet: the save is followed by acquire() on commit.
+    assert default_storage.save(
+        'recipes/stew.png', ContentFile(b'soup')
+    ) == name
+    for callback in callbacks:
+        callback()
+    assert default_storage.exists(name)
+    acquire(name)
+    assert MediaBlob.objects.get(name=name).refs == 1
+
+
+@pytest.mark.django_db
+def test_saving_again_after_the_orphan_is_deleted_writes_the_file(
+    django_capture_on_commit_callbacks
+):
+    name, callbacks = save_and_release(django_capture_on_commit_callbacks)
+    for callback in callbacks:
+        callback()
+    assert default_storage.save(
+        'recipes/stew.png', ContentFile(b'soup')
+    ) == name
+    with default_storage.open(name) as file:
+        assert file.read() == b'soup'
@@ -0,0 +1,108 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import caches
+
+from api.throttling import TokenBucketThrottle
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def check(clock):
+    """
+    Check a request against a '3/min' bucket: 3 requests at once, then
+    one every 20 seconds. Return the wait on rejection, else None.
+    """
+    class Throttle(TokenBucketThrottle):
+        scope = 'test'
+        rate = '3/min'
+        timer = clock
+
+        def get_cache_key(self, request, view):
+            return 'throttle:test:client'
+
+    def check():
+        throttle = Throttle()
+        if throttle.allow_request(SimpleNamespace(), None):
+            return None
+        return throttle.wait()
+    return check
+
+
+def test_burst_then_retry_after(check):
+    assert [check() for _ in range(3)] == [None, None, None]
+    assert check() == pytest.approx(20)
+
+
+def test_tokens_refill_one_per_interval(check, clock):
+    for _ in range(3):
+        check()
+    clock.now += 5
+    assert check() == pytest.approx(15)
+    clock.now += 15
+    assert check() is None
+    assert check() == pytest.approx(20)
+
+
+def test_full_bucket_does_not_save_tokens(check, clock):
+    check()
+    clock.now += 3600
+    assert [check() for _ in range(3)] == [None, None, None]
+    assert check() == pytest.approx(20)
+
+
+def test_rejected_requests_take_no_tokens(check, clock):
+    for _ in range(3):
+        check()
+    for _ in range(10):
+        assert check() == pytest.approx(20)
+    clock.now += 20
+    assert check() is None
+
+
+@pytest.mark.django_db
+def test_scoped_throttle_answers_429(user, user_client, monkeypatch):
+    monkeypatch.setitem(
+        TokenBucketThrottle.THROTTLE_RATES, 'shopping_cart', '2/min'
+    )
+    responses = [
+        user_client.get('/api/recipes/download_shopping_cart/')
+        for _ in range(3)
+    ]
+    assert [response.status_code for response in responses] == [
+        200, 200, 429
+    ]
+    assert 29 <= int(responses[-1]['Retry-After']) <= 30
+    key = f'throttle:shopping_cart:{user.pk}'
+    assert caches['throttle'].get(key) is not None
+    assert caches['default'].get(key) is None
+
+
+def test_requests_over_user_rate_take_no_scoped_token(
+    user, user_client, monkeypatch
+):
+    monkeypatch.setitem(TokenBucketThrottle.THROTTLE_RATES, 'user', '1/min')
+    responses = [
+        user_client.get('/api/recipes/download_shopping_cart/')
+        for _ in range(3)
+    ]
+    assert [response.status_code for response in responses] == [
+        200, 429, 429
+    ]
+    # One token of the scoped 10/min bucket: full again in 6 seconds.
+    key = f'throttle:shopping_cart:{user.pk}'
+    full_at = caches['throttle'].get(key)
+    assert full_at - time.time() <= 6
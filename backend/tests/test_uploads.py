@@ -0,0 +1,102 @@
+import io
+import os
+
+import pytest
+from django.db import connection
+from PIL import Image
+
+from api.models import ImageUpload
+from api.uploads import OffsetConflict, append_chunk
+from recipes.models import Ingredient, Tag
+
+
+@pytest.fixture
+def image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'blue').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def send_chunk(client, token, offset, data):
+    return client.generic(
+        'PATCH', f'/api/uploads/{token}/', data,
+        content_type='application/offset+octet-stream',
+        HTTP_UPLOAD_OFFSET=str(offset)
+    )
+
+
+def open_paths():
+    return {
+        os.path.realpath(f'/proc/self/fd/{fd}')
+        for fd in os.listdir('/proc/self/fd')
+    }
+
+
+@pytest.mark.django_db
+def test_resumed_upload_becomes_recipe_image(user_client, image, settings):
+    response = user_client.post(
+        '/api/uploads/', {'filename': 'soup.png', 'size': len(image)},
+        format='json'
+    )
+    token = response.data['token']
+    half = len(image) // 2
+    assert send_chunk(user_client, token, 0, image[:half]).data == {
+        'offset': half
+    }
+    conflict = send_chunk(user_client, token, 0, image[:half])
+    assert conflict.status_code == 409
+    assert conflict.data['detail'] == f'Expected offset {half}.'
+    assert send_chunk(user_client, token, half, image[half:]).data == {
+        'offset': len(image)
+    }
+
+    response = user_client.post('/api/recipes/', {
+        'name': 'Soup', 'text': 'Boil.', 'cooking_time': 10,
+        'image': f'upload:{token}',
+        'tags': [Tag.objects.create(name='Lunch', slug='lunch').pk],
+        'ingredients': [{
+            'id': Ingredient.objects.create(
+                name='Water', measurement_unit='ml'
+            ).pk,
+            'amount': 500,
+        }],
+    }, format='json')
+    assert response.status_code == 201
+    stored = os.path.realpath(os.path.join(
+        settings.MEDIA_ROOT,
+        response.data['image'].split(settings.MEDIA_URL, 1)[1]
+    ))
+    with open(stored, 'rb') as file:
+        assert file.read() == image
+    assert stored not in open_paths()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_chunk_is_read_without_a_transaction(user):
+    upload = ImageUpload.objects.create(
+        user=user, filename='soup.png', size=8
+    )
+    in_transaction = []
+
+    class Stream(io.BytesIO):
+        def read(self, size=-1):
+            in_transaction.append(connection.in_atomic_block)
+            return super().read(size)
+
+    assert append_chunk(upload, Stream(b'12345678'), 0, 8) == 8
+    assert in_transaction and not any(in_transaction)
+
+
+@pytest.mark.django_db
+def test_racing_chunk_loses_and_writes_nothing(user):
+    upload = ImageUpload.objects.create(
+        user=user, filename='soup.png', size=8
+    )
+    first = ImageUpload.objects.get(pk=upload.pk)
+    second = ImageUpload.objects.get(pk=upload.pk)
+    assert append_chunk(first, io.BytesIO(b'aaaa'), 0, 4) == 4
+    with pytest.raises(OffsetConflict):
+        append_chunk(second, io.BytesIO(b'bbbb'), 0, 4)
+    assert ImageUpload.objects.get(pk=upload.pk).offset == 4
+    with open(upload.path, 'rb') as file:
+        assert file.read() == b'aaaa'
@@ -0,0 +1,36 @@
+#!/bin/sh
+# Create the maps written by manage.py export_gateway_config if the
+# backend has not yet, and reload nginx whenever it rewrites them.
+# Also prepare the directory of the short-link redirect logs.
+set -e
+
+CONFIG=/etc/nginx/gateway/foodgram.conf
+INTERVAL=${GATEWAY_RELOAD_INTERVAL:-5}
+
+LOGS=/etc/nginx/gateway/short_links
+
+mkdir -p "$(dirname "$CONFIG")"
+# Workers write the short-link logs that the backend reads and deletes.
+mkdir -p "$LOGS"
+chown nginx "$LOGS"
+if [ ! -f "$CONFIG" ]; then
+    cat > "$CONFIG" <<'MAPS'
+map $host $micro_cache_version {
+    default 0;
+}
+map $short_link $short_link_target {
+    default "";
+}
+MAPS
+fi
+
+# The file is replaced, never edited, so a new inode means new maps.
+(
+    last=$(stat -c '%i %Y' "$CONFIG")
+    while sleep "$INTERVAL"; do
+        current=$(stat -c '%i %Y' "$CONFIG" 2>/dev/null) || continue
+        [ "$current" = "$last" ] && continue
+        last=$current
+        nginx -t -q && nginx -s reload
+    done
+) &